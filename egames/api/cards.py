@@ -0,0 +1,38 @@
+from rest_framework.renderers import JSONRenderer
+
+from egames.models import Game, GameCard
+from .rendering import RawJSON
+from .serializers import GameSerializer, latest_reviews_prefetch
+
+CARD_CHUNK_SIZE = 200
+
+
+def render_game_cards(game_ids):
+    games = Game.objects.filter(id__in=game_ids).prefetch_related('genre_set', latest_reviews_prefetch())
+    renderer = JSONRenderer()
+    return {game.id: renderer.render(GameSerializer(game).data).decode() for game in games}
+
+
+def refresh_game_cards(game_ids):
+    """Перерисовывает сохраненные карточки игр; вызывается после любого изменения игры, ее жанров или отзывов."""
+    game_ids = list(game_ids)
+    rendered = {}
+    for start in range(0, len(game_ids), CARD_CHUNK_SIZE):
+        payloads = render_game_cards(game_ids[start:start + CARD_CHUNK_SIZE])
+        GameCard.objects.bulk_create(
+            [GameCard(game_id=game_id, payload=payload) for game_id, payload in payloads.items()],
+            update_conflicts=True, unique_fields=['game'], update_fields=['payload', 'updated_at'],
+        )
+        rendered.update(payloads)
+    return rendered
+
+
+def get_game_cards(game_ids):
+    """Возвращает {id игры: RawJSON карточки}; недостающие карточки строятся и сохраняются."""
+    cards = {game_id: RawJSON(payload.encode())
+             for game_id, payload in GameCard.objects.filter(game_id__in=game_ids).values_list('game_id', 'payload')}
+    missing = [game_id for game_id in game_ids if game_id not in cards]
+    if missing:
+        cards.update({game_id: RawJSON(payload.encode())
+                      for game_id, payload in refresh_game_cards(missing).items()})
+    return cards
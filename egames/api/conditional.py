@@ -0,0 +1,35 @@
+import hashlib
+
+from django.views.decorators.http import condition
+
+from egames.cache import CATALOG_SCOPE, gamer_scope, get_last_modified, get_version
+
+
+def _path_hash(request):
+    return hashlib.sha1(request.get_full_path().encode()).hexdigest()[:16]
+
+
+def _catalog_etag(request, *args, **kwargs):
+    return f'{get_version(CATALOG_SCOPE)}-{_path_hash(request)}'
+
+
+def _catalog_last_modified(request, *args, **kwargs):
+    return get_last_modified(CATALOG_SCOPE)
+
+
+# ETag и Last-Modified вычисляются по счетчикам версий без обращения к базе,
+# поэтому ответ 304 не требует ни запросов, ни сериализации
+catalog_condition = condition(etag_func=_catalog_etag, last_modified_func=_catalog_last_modified)
+
+
+def gamer_condition(name):
+    """Условный GET для списков геймера, в которые вложены данные каталога."""
+    def etag(request, *args, **kwargs):
+        scope = gamer_scope(name, request.user.id)
+        return f'{request.user.id}-{get_version(CATALOG_SCOPE)}-{get_version(scope)}-{_path_hash(request)}'
+
+    def last_modified(request, *args, **kwargs):
+        scope = gamer_scope(name, request.user.id)
+        return max(get_last_modified(CATALOG_SCOPE), get_last_modified(scope))
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -0,0 +1,149 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def _split(value):
+    if value is None:
+        return None
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+def parse_field_params(query_params):
+    """?fields=id,title,game.final_price&expand=genres -> (fields или None, expand или None)."""
+    return _split(query_params.get('fields')), _split(query_params.get('expand'))
+
+
+def field_options(request):
+    fields, expand = parse_field_params(request.query_params)
+    return {'fields': fields, 'expand': expand}
+
+
+def has_field_params(request):
+    return 'fields' in request.query_params or 'expand' in request.query_params
+
+
+def _nested_names(names, prefix):
+    if names is None:
+        return None
+    nested = {name[len(prefix) + 1:] for name in names if name.startswith(f'{prefix}.')}
+    return nested or None
+
+
+class DynamicFieldsMixin:
+    """
+    Сериализатор с выборочными полями.
+    fields - какие поля оставить (поля вложенных сериализаторов через точку: game.title),
+    expand - какие из Meta.expandable_fields включить в ответ.
+    Без fields и expand сериализатор отдает все поля, как и раньше.
+    Пустой fields, неизвестные поля и поля только для записи приводят к InvalidFields.
+    Выбор вложенных полей для SerializerMethodField доступен через nested_options;
+    сериализатор такого поля указывается в Meta.nested_serializers, чтобы неизвестные
+    вложенные поля отклонялись сразу, а не при формировании ответа.
+    """
+    nested_options = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None or expand is not None:
+            self.restrict_fields(fields, expand)
+
+    def restrict_fields(self, fields, expand):
+        expandable = getattr(self.Meta, 'expandable_fields', ())
+        top_fields = {name.split('.')[0] for name in fields} if fields is not None else None
+        top_expand = {name.split('.')[0] for name in expand or ()}
+        if top_fields is not None and not top_fields:
+            raise InvalidFields('Список полей fields не может быть пустым')
+        unknown = (top_fields or set()) | top_expand
+        # Поля только для записи в ответ не попадают, поэтому запросить их нельзя
+        unknown -= {name for name, field in self.fields.items() if not field.write_only}
+        if unknown:
+            raise InvalidFields(f'Неизвестные поля: {", ".join(sorted(unknown))}')
+        for name in list(self.fields):
+            if top_fields is not None:
+                keep = name in top_fields or name in top_expand
+            else:
+                keep = name not in expandable or name in top_expand
+            if not keep:
+                self.fields.pop(name)
+        nested_serializers = getattr(self.Meta, 'nested_serializers', {})
+        self.nested_options = {}
+        for name, field in self.fields.items():
+            nested_fields = _nested_names(fields, name)
+            nested_expand = _nested_names(expand, name)
+            if nested_fields is None and nested_expand is None:
+                continue
+            self.nested_options[name] = {'fields': nested_fields, 'expand': nested_expand}
+            child = getattr(field, 'child', field)
+            if isinstance(child, DynamicFieldsMixin):
+                child.restrict_fields(nested_fields, nested_expand)
+            elif name in nested_serializers:
+                nested_serializers[name](**self.nested_options[name])
+            else:
+                raise InvalidFields(f'У поля {name} нет вложенных полей')
+
+
+def _relation(model, accessor):
+    for field in model._meta.get_fields():
+        name = field.get_accessor_name() if field.auto_created and not field.concrete else field.name
+        if name == accessor:
+            return field
+    raise FieldDoesNotExist(accessor)
+
+
+def _prepare(serializer, queryset, extra=()):
+    meta = serializer.Meta
+    model = meta.model
+    concrete = {field.name for field in model._meta.concrete_fields}
+    prefetch_fields = getattr(meta, 'prefetch_fields', {})
+    field_sources = getattr(meta, 'field_sources', {})
+    columns = {model._meta.pk.name, *extra}
+    related = []
+    prefetches = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in prefetch_fields:
+            prefetches.append(prefetch_fields[name]())
+            continue
+        if name in field_sources:
+            columns.update(field_sources[name])
+            continue
+        if field.source == '*':
+            continue
+        path = field.source.split('.')
+        child = getattr(field, 'child', field)
+        if isinstance(child, serializers.ModelSerializer):
+            relation = _relation(model, path[0])
+            remote = ()
+            if relation.concrete:
+                columns.add(path[0])
+            elif relation.one_to_many:
+                remote = (relation.field.name,)
+            nested = _prepare(child, child.Meta.model.objects.all(), remote)
+            prefetches.append(Prefetch(path[0], queryset=nested))
+        elif len(path) > 1 and path[0] in concrete:
+            # Поле связанной модели (role.role_name) подгружается тем же запросом через JOIN
+            related.append(path[0])
+            columns.update({path[0], '__'.join(path)})
+        elif path[0] in concrete:
+            columns.add(path[0])
+    queryset = queryset.only(*columns)
+    if related:
+        queryset = queryset.select_related(*related)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset
+
+
+def sparse_queryset(serializer_class, queryset, fields=None, expand=None, extra=()):
+    """
+    Оставляет в queryset только столбцы и prefetch, которые нужны выбранным полям сериализатора:
+    не запрошенные вложенные данные не стоят ни запросов, ни времени на сериализацию.
+    extra - столбцы, нужные помимо сериализатора (например, для сортировки).
+    """
+    return _prepare(serializer_class(fields=fields, expand=expand), queryset, extra)
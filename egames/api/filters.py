@@ -0,0 +1,114 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from egames.models import Game, GenreGame
+
+PRICE_BUCKETS = (0, 10, 20, 30, 50, 100)
+
+
+def parse_game_filters(params):
+    """
+    Разбирает параметры фильтрации каталога в словарь {имя фасета: условие}.
+    Некорректные значения приводят к ValueError.
+    """
+    filters = {}
+    if params.get('genre') is not None:
+        filters['genre'] = Q(genre=int(params['genre']))
+    price = Q()
+    if params.get('min_price') is not None:
+        price &= Q(final_price__gte=float(params['min_price']))
+    if params.get('max_price') is not None:
+        price &= Q(final_price__lte=float(params['max_price']))
+    if price:
+        filters['price'] = price
+    if params.get('min_discount') is not None:
+        filters['discount'] = Q(discount_percent__gte=float(params['min_discount']))
+    if params.get('min_rating') is not None:
+        filters['rating'] = Q(rating_avg__gte=float(params['min_rating']))
+    if params.get('is_deleted') is not None:
+        is_deleted = params['is_deleted'].lower()
+        if is_deleted not in ('true', 'false'):
+            raise ValueError('is_deleted должен быть true или false')
+        filters['is_deleted'] = Q(is_deleted=is_deleted == 'true')
+    return filters
+
+
+def apply_game_filters(queryset, filters, exclude=None):
+    for name, condition in filters.items():
+        if name != exclude:
+            queryset = queryset.filter(condition)
+    return queryset
+
+
+def game_facets(filters):
+    # Счетчик каждого фасета строится без его собственного фильтра,
+    # чтобы клиент видел, сколько игр даст выбор другого значения
+    genre_games = apply_game_filters(Game.objects.all(), filters, exclude='genre').values('id')
+    genres = (GenreGame.objects.filter(game__in=genre_games, genre__is_deleted=False)
+              .values('genre_id', 'genre__title_genre').annotate(count=Count('game_id'))
+              .order_by('-count', 'genre_id'))
+
+    bounds = list(zip(PRICE_BUCKETS, PRICE_BUCKETS[1:] + (None,)))
+    buckets = {}
+    for i, (low, high) in enumerate(bounds):
+        condition = Q(final_price__gte=low)
+        if high is not None:
+            condition &= Q(final_price__lt=high)
+        buckets[f'bucket_{i}'] = Count('id', filter=condition)
+    counts = apply_game_filters(Game.objects.all(), filters, exclude='price').aggregate(**buckets)
+
+    return {
+        'genres': [{'id': row['genre_id'], 'title_genre': row['genre__title_genre'], 'count': row['count']}
+                   for row in genres],
+        'price': [{'from': low, 'to': high, 'count': counts[f'bucket_{i}']}
+                  for i, (low, high) in enumerate(bounds)],
+    }
+
+
+def _parse_moment(value, end=False):
+    day = parse_date(value)
+    if day is not None:
+        # Дата без времени в конце диапазона включает весь день
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(f'Некорректная дата: {value}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_date_range(params, field):
+    """?date_from=2024-01-01&date_to=2024-01-31 -> условия filter() по полю field; date_to включительно."""
+    conditions = {}
+    if params.get('date_from'):
+        conditions[f'{field}__gte'] = _parse_moment(params['date_from'])
+    if params.get('date_to'):
+        date_to = params['date_to']
+        if parse_date(date_to) is not None:
+            conditions[f'{field}__lt'] = _parse_moment(date_to, end=True)
+        else:
+            conditions[f'{field}__lte'] = _parse_moment(date_to)
+    return conditions
+
+
+def parse_day_range(params, default_days, max_days):
+    """?date_from=2024-01-01&date_to=2024-01-31 -> (первый день, последний день) включительно."""
+    days = {}
+    for name in ('date_from', 'date_to'):
+        value = params.get(name)
+        if value:
+            days[name] = parse_date(value)
+            if days[name] is None:
+                raise ValueError(f'Некорректная дата: {value}')
+    day_to = days.get('date_to') or timezone.localdate()
+    day_from = days.get('date_from') or day_to - timedelta(days=default_days - 1)
+    if day_from > day_to:
+        raise ValueError('date_from не может быть позже date_to')
+    if (day_to - day_from).days >= max_days:
+        raise ValueError(f'Период отчета не может превышать {max_days} дней')
+    return day_from, day_to
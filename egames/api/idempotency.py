@@ -0,0 +1,94 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from egames.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# Сохраненный ответ повторяется в течение KEY_TTL; запрос, владелец которого
+# не завершился за IN_PROGRESS_TIMEOUT (например, упал процесс), можно выполнить заново
+KEY_TTL = timedelta(hours=24)
+IN_PROGRESS_TIMEOUT = timedelta(minutes=5)
+CLAIM_ATTEMPTS = 3
+
+
+def _hash(*parts):
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _claim(key_hash, request_hash):
+    """Возвращает None, если ключ занят этим запросом, иначе уже существующую запись."""
+    now = timezone.now()
+    for _ in range(CLAIM_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(key_hash=key_hash, request_hash=request_hash, created_at=now)
+            return None
+        except IntegrityError as e:
+            error = e
+        existing = IdempotencyKey.objects.filter(key_hash=key_hash).first()
+        if existing is None:
+            continue
+        expired = existing.created_at < now - KEY_TTL
+        abandoned = existing.status_code is None and existing.created_at < now - IN_PROGRESS_TIMEOUT
+        if not (expired or abandoned):
+            return existing
+        IdempotencyKey.objects.filter(key_hash=key_hash, created_at=existing.created_at).delete()
+    raise error
+
+
+def idempotent(view):
+    """
+    Поддержка заголовка Idempotency-Key: повторный запрос с тем же ключом получает
+    сохраненный ответ первого запроса, а сам обработчик повторно не выполняется.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return view(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({'message': f'Заголовок {IDEMPOTENCY_HEADER} должен быть '
+                                        f'непустой строкой длиной не более {MAX_KEY_LENGTH} символов.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        key_hash = _hash(request.user.id, view.__name__, key)
+        request_hash = _hash(json.dumps(request.data, sort_keys=True, default=str), args, kwargs)
+        existing = _claim(key_hash, request_hash)
+        if existing is not None:
+            if existing.request_hash != request_hash:
+                return Response({'message': 'Этот Idempotency-Key уже использован для другого запроса.'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if existing.status_code is None:
+                return Response({'message': 'Запрос с этим Idempotency-Key еще выполняется.'},
+                                status=status.HTTP_409_CONFLICT)
+            response = HttpResponse(bytes(existing.response), status=existing.status_code,
+                                    content_type='application/json')
+            response['Idempotent-Replayed'] = 'true'
+            return response
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            IdempotencyKey.objects.filter(key_hash=key_hash).delete()
+            raise
+        if response.status_code >= 500:
+            # Ошибку сервера клиент должен иметь возможность повторить
+            IdempotencyKey.objects.filter(key_hash=key_hash).delete()
+            return response
+        content = JSONRenderer().render(response.data) if hasattr(response, 'data') else response.content
+        IdempotencyKey.objects.filter(key_hash=key_hash).update(status_code=response.status_code, response=content)
+        return response
+    return wrapper
+
+
+def purge_expired_keys(now=None):
+    now = now or timezone.now()
+    return IdempotencyKey.objects.filter(created_at__lt=now - KEY_TTL).delete()[0]
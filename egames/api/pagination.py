@@ -0,0 +1,82 @@
+import base64
+import json
+from operator import attrgetter
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor('Некорректный cursor')
+    # В cursor попадают только числа и строки (даты в isoformat); остальное - подделка
+    if not isinstance(values, list) or not all(
+            isinstance(value, (int, float, str)) and not isinstance(value, bool) for value in values):
+        raise InvalidCursor('Некорректный cursor')
+    return values
+
+
+def get_page_size(request, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    page_size = request.query_params.get('page_size')
+    if page_size is None:
+        return default
+    return max(1, min(int(page_size), maximum))
+
+
+def _cursor_value(item, field):
+    value = attrgetter(field.lstrip('-').replace('__', '.'))(item)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _keyset_filter(ordering, values):
+    condition = Q()
+    for i, field in enumerate(ordering):
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{field.lstrip("-")}__{lookup}': values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            step &= Q(**{prev_field.lstrip('-'): prev_value})
+        condition |= step
+    return condition
+
+
+def paginate_keyset(queryset, request, ordering=('id',)):
+    """
+    Keyset-пагинация: следующая страница выбирается условием по последней строке
+    предыдущей, поэтому стоимость запроса не зависит от глубины листания.
+    Последним полем ordering должен быть уникальный ключ (обычно id).
+    Возвращает (элементы страницы, cursor следующей страницы или None).
+    """
+    page_size = get_page_size(request)
+    queryset = queryset.order_by(*ordering)
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(ordering):
+            raise InvalidCursor('Некорректный cursor')
+        try:
+            queryset = queryset.filter(_keyset_filter(ordering, values))
+        except ValidationError:
+            # Например, строка вместо даты: поле отвергает значение еще при построении запроса
+            raise InvalidCursor('Некорректный cursor')
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor([_cursor_value(items[-1], field) for field in ordering])
+    return items, next_cursor
@@ -0,0 +1,23 @@
+import json
+
+from django.http import HttpResponse
+from rest_framework.utils import encoders
+
+
+class RawJSON(bytes):
+    """Уже отрендеренный фрагмент JSON, который вставляется в ответ без изменений."""
+
+
+def render_json(value):
+    if isinstance(value, RawJSON):
+        return value
+    if isinstance(value, dict):
+        return b'{' + b','.join(render_json(str(key)) + b':' + render_json(item)
+                                for key, item in value.items()) + b'}'
+    if isinstance(value, (list, tuple)):
+        return b'[' + b','.join(render_json(item) for item in value) + b']'
+    return json.dumps(value, cls=encoders.JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def raw_json_response(data, status=200):
+    return HttpResponse(render_json(data), status=status, content_type='application/json')
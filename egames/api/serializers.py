@@ -1,17 +1,27 @@
 from datetime import date
+from django.db.models import Prefetch
 from rest_framework import serializers
-from egames.models import Game, Staff, Role, Gamer, Genre, Purchase, Library, Friend, Wishlist, Review
+from egames.images import cover_urls
+from .fields import DynamicFieldsMixin
+from egames.models import (Game, Staff, Role, Gamer, Genre, Purchase, Library, Friend, Wishlist, Review,
+                           DiscountCampaign, GamePriceWindow, WalletEntry, WishlistPriceDrop)
+from egames.wallet import from_cents
+
+# Полный список отзывов отдается отдельной лентой, в карточке игры - только последние
+LATEST_REVIEWS_COUNT = 3
 
 
 # ================================== ЖАНРЫ ИГР ==================================
-class GenreSerializer(serializers.ModelSerializer):
+class GenreSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Genre
         fields = ['id', 'title_genre', 'description', 'is_deleted']
+        # Уникальность названия проверяет ограничение БД при сохранении, без отдельного запроса
+        validators = []
 
 
 # ================================== ДОБАВЛЕНИЕ ОТЗЫВА К ИГРЕ ==================================
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     gamer = serializers.ReadOnlyField(source='gamer.username')
 
     class Meta:
@@ -19,26 +29,53 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ['gamer', 'rating', 'comment', 'date']
 
 
+def latest_reviews_queryset():
+    return Review.objects.filter(is_deleted=False).select_related('gamer').order_by('-date', '-id')
+
+
+def latest_reviews_prefetch():
+    return Prefetch('review_set', queryset=latest_reviews_queryset()[:LATEST_REVIEWS_COUNT],
+                    to_attr='latest_reviews')
+
+
 # ================================== ИГРЫ ==================================
-class GameSerializer(serializers.ModelSerializer):
+class GameSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     genres = GenreSerializer(many=True, read_only=True, source='genre_set')
-    reviews = ReviewSerializer(many=True, read_only=True)
+    # Под прежним ключом reviews отдаются только последние отзывы; полный список - в ленте games/reviews/<id>/
+    reviews = serializers.SerializerMethodField()
+    cover_thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = Game
-        fields = ('id', 'title', 'cover_image', 'price', 'discount_percent',
-                  'final_price', 'is_deleted', 'description', 'genres', 'reviews')
+        fields = ('id', 'title', 'cover_image', 'cover_thumbnails', 'price', 'discount_percent', 'campaign_discount',
+                  'final_price', 'is_deleted', 'description', 'review_count', 'rating_avg', 'genres', 'reviews')
+        read_only_fields = ('campaign_discount', 'review_count', 'rating_avg')
+        extra_kwargs = {'title': {'validators': []}}
+        expandable_fields = ('genres', 'reviews')
+        prefetch_fields = {'reviews': latest_reviews_prefetch}
+        nested_serializers = {'reviews': ReviewSerializer}
+        field_sources = {'cover_thumbnails': ('cover_hash',)}
+
+    def get_cover_thumbnails(self, obj):
+        return cover_urls(obj.cover_hash)
+
+    def get_reviews(self, obj):
+        reviews = getattr(obj, 'latest_reviews', None)
+        if reviews is None:
+            reviews = latest_reviews_queryset().filter(game=obj)[:LATEST_REVIEWS_COUNT]
+        return ReviewSerializer(reviews, many=True, **self.nested_options.get('reviews', {})).data
+
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        reviews = Review.objects.filter(game=instance)
-        review_data = ReviewSerializer(reviews, many=True).data
-        data['reviews'] = review_data
-        return data
+class GameListSerializer(GameSerializer):
+    reviews = None
+
+    class Meta(GameSerializer.Meta):
+        fields = ('id', 'title', 'cover_image', 'cover_thumbnails', 'price', 'discount_percent', 'campaign_discount',
+                  'final_price', 'is_deleted', 'description', 'review_count', 'rating_avg', 'genres')
 
 
 # ================================== ПОКУПКИ ==================================
-class PurchaseSerializer(serializers.ModelSerializer):
+class PurchaseSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     game = GameSerializer()
 
     class Meta:
@@ -46,8 +83,16 @@ class PurchaseSerializer(serializers.ModelSerializer):
         fields = ('game', 'timestamp')
 
 
+class PurchaseRowSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    title = serializers.ReadOnlyField(source='game.title')
+
+    class Meta:
+        model = Purchase
+        fields = ('id', 'game', 'title', 'price', 'timestamp')
+
+
 # ================================== БИБЛИОТЕКА ==================================
-class LibrarySerializer(serializers.ModelSerializer):
+class LibrarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     game = GameSerializer()
 
     class Meta:
@@ -56,7 +101,7 @@ class LibrarySerializer(serializers.ModelSerializer):
 
 
 # ================================== ПОКУПКИ ==================================
-class WishlistSerializer(serializers.ModelSerializer):
+class WishlistSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     game = GameSerializer()
 
     class Meta:
@@ -64,15 +109,60 @@ class WishlistSerializer(serializers.ModelSerializer):
         fields = ('id', 'gamer', 'game')
 
 
+class WishlistPriceDropSerializer(serializers.ModelSerializer):
+    title = serializers.ReadOnlyField(source='game.title')
+    final_price = serializers.ReadOnlyField(source='game.final_price')
+
+    class Meta:
+        model = WishlistPriceDrop
+        fields = ('id', 'game', 'title', 'old_price', 'final_price', 'created_at')
+
+
+# ================================== КОШЕЛЕК ==================================
+class WalletEntrySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    amount = serializers.SerializerMethodField()
+
+    class Meta:
+        model = WalletEntry
+        fields = ('id', 'amount', 'kind', 'game', 'created_at')
+        field_sources = {'amount': ('amount_cents',)}
+
+    def get_amount(self, obj):
+        return from_cents(obj.amount_cents)
+
+
+# ================================== СКИДОЧНЫЕ КАМПАНИИ ==================================
+class DiscountCampaignSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = DiscountCampaign
+        fields = ('id', 'title', 'discount_percent', 'starts_at', 'ends_at', 'games', 'genres', 'is_deleted')
+        read_only_fields = ('is_deleted',)
+
+    def validate(self, attrs):
+        if not 0 < attrs['discount_percent'] <= 100:
+            raise serializers.ValidationError({'discount_percent': 'Скидка должна быть больше 0 и не больше 100.'})
+        if attrs['ends_at'] <= attrs['starts_at']:
+            raise serializers.ValidationError({'ends_at': 'Кампания должна заканчиваться позже, чем начинается.'})
+        if not attrs.get('games') and not attrs.get('genres'):
+            raise serializers.ValidationError('Укажите игры или жанры, на которые действует кампания.')
+        return attrs
+
+
+class GamePriceWindowSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = GamePriceWindow
+        fields = ('starts_at', 'ends_at', 'discount_percent', 'final_price')
+
+
 # ================================== РОЛИ ==================================
-class RoleSerializer(serializers.ModelSerializer):
+class RoleSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Role
         fields = '__all__'
 
 
 # ================================== СОТРУДНИКИ ==================================
-class StaffSerializer(serializers.ModelSerializer):
+class StaffSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     role_name = serializers.StringRelatedField(source='role.role_name', read_only=True)
 
     class Meta:
@@ -93,7 +183,7 @@ class StaffSerializer(serializers.ModelSerializer):
         return staff
 
 
-class SelfStaffSerializer(serializers.ModelSerializer):
+class SelfStaffSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     role_name = serializers.StringRelatedField(source='role.role_name', read_only=True)
 
     class Meta:
@@ -115,7 +205,7 @@ class EditStaffProfileSerializer(serializers.ModelSerializer):
 
 
 # ================================== ГЕЙМЕРЫ ==================================
-class GamerFriendSerializer(serializers.ModelSerializer):
+class GamerFriendSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Gamer
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'birth_date', 'wallet']
@@ -125,7 +215,7 @@ class GamerFriendSerializer(serializers.ModelSerializer):
         }
 
 
-class FriendSerializer(serializers.ModelSerializer):
+class FriendSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     friend = GamerFriendSerializer(read_only=True)
 
     class Meta:
@@ -133,13 +223,14 @@ class FriendSerializer(serializers.ModelSerializer):
         fields = ['friend']
 
 
-class GamerSerializer(serializers.ModelSerializer):
+class GamerSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     friends = FriendSerializer(many=True, read_only=True)
 
     class Meta:
         model = Gamer
         fields = ['id', 'username', 'email', 'password', 'first_name', 'last_name', 'birth_date', 'wallet', 'friends']
         extra_kwargs = {'password': {'write_only': True}}
+        expandable_fields = ('friends',)
 
     def create(self, validated_data):
         username = validated_data.get('username', None)
@@ -158,7 +249,7 @@ class GamerSerializer(serializers.ModelSerializer):
         return gamer
 
 
-class GamerSearchSerializer(serializers.ModelSerializer):
+class GamerSearchSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     friends = FriendSerializer(many=True, read_only=True)
 
     class Meta:
@@ -168,14 +259,16 @@ class GamerSearchSerializer(serializers.ModelSerializer):
             'wallet': {'write_only': True},
             'email': {'write_only': True}
         }
+        expandable_fields = ('friends',)
 
 
-class SelfGamerSerializer(serializers.ModelSerializer):
+class SelfGamerSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     friends = FriendSerializer(many=True, read_only=True)
 
     class Meta:
         model = Gamer
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'birth_date', 'wallet', 'friends']
+        expandable_fields = ('friends',)
 
 
 class EditGamerProfileSerializer(serializers.ModelSerializer):
@@ -8,7 +8,12 @@ from .views import (buy_and_add_to_library, gamer_purchases, gamer_library,
                     get_all_staff, delete_staff, staff_profile, edit_staff_profile, search_staff, get_all_genres,
                     search_genre, create_genre, update_genre, delete_genre, add_game_to_wishlist, gamer_wishlist,
                     delete_from_wishlist, add_review_to_game, edit_own_review, delete_own_review, add_role_to_staff,
-                    get_all_games, restore_game, restore_role, restore_staff, restore_gamer, restore_genre)
+                    get_all_games, restore_game, restore_role, restore_staff, restore_gamer, restore_genre,
+                    import_games_view, export_games_view, reprice_games_view,
+                    get_all_campaigns, create_campaign, delete_campaign, game_price_timeline,
+                    add_genres_to_games, delete_genres_from_games, game_reviews, checkout_cart_view,
+                    wallet_history, gamer_ownership, sales_top_sellers, sales_by_genre, sales_timeline,
+                    wishlist_on_sale, mutual_friends, friend_suggestions)
 
 urlpatterns = [
     path('games/', get_all_games, name='games-list'),
@@ -17,8 +22,18 @@ urlpatterns = [
     path('games/update/<int:id>/', update_game, name='update-game'),
     path('games/delete/', delete_game, name='delete-game'),
     path('games/restore/', restore_game, name='restore-game'),
+    path('games/reprice/', reprice_games_view, name='reprice-games'),
+    path('games/price-timeline/<int:id>/', game_price_timeline, name='game-price-timeline'),
+    path('campaigns/', get_all_campaigns, name='campaigns-list'),
+    path('campaigns/create/', create_campaign, name='create-campaign'),
+    path('campaigns/delete/', delete_campaign, name='delete-campaign'),
+    path('games/import/', import_games_view, name='import-games'),
+    path('games/export/', export_games_view, name='export-games'),
     path('genre-game/', add_genre_to_game, name='add-genre-to-game'),
     path('genre-game/delete/', delete_genre_from_game, name='delete-genre-from-game'),
+    path('genre-game/batch/', add_genres_to_games, name='add-genres-to-games'),
+    path('genre-game/batch/delete/', delete_genres_from_games, name='delete-genres-from-games'),
+    path('games/reviews/<int:id>/', game_reviews, name='game-reviews'),
     path('games/review/<int:id>/', add_review_to_game, name='add-review-to-game'),
     path('games/review/edit/<int:id>/', edit_own_review, name='edit-own-review'),
     path('games/review/delete/<int:id>/', delete_own_review, name='delete-own-review'),
@@ -44,8 +59,15 @@ urlpatterns = [
     path('gamer/profile/edit/', edit_gamer_profile, name='edit-gamer-profile'),
     path('gamer/search/', search_gamer, name='gamer-search'),
     path('gamer/wallet/', wallet_deposit, name='wallet-deposit'),
+    path('gamer/wallet/history/', wallet_history, name='wallet-history'),
     path('gamer/friends/', add_friend, name='add-friend'),
     path('gamer/friends/delete/', delete_friend, name='delete-friend'),
+    path('gamer/friends/mutual/<int:id>/', mutual_friends, name='mutual-friends'),
+    path('gamer/friends/suggestions/', friend_suggestions, name='friend-suggestions'),
+
+    path('sales/top/', sales_top_sellers, name='sales-top-sellers'),
+    path('sales/genres/', sales_by_genre, name='sales-by-genre'),
+    path('sales/timeline/', sales_timeline, name='sales-timeline'),
 
     path('genre/', get_all_genres, name='genres-list'),
     path('genre/search/', search_genre, name='genre-search'),
@@ -55,9 +77,12 @@ urlpatterns = [
     path('genre/restore/', restore_genre, name='restore-genre'),
 
     path('buy-add-to-library/', buy_and_add_to_library, name='buy-and-add-to-library'),
+    path('cart/checkout/', checkout_cart_view, name='checkout-cart'),
     path('purchases/', gamer_purchases, name='get-purchases'),
     path('library/', gamer_library, name='gamer-library'),
+    path('ownership/', gamer_ownership, name='gamer-ownership'),
     path('add-to-wishlist/', add_game_to_wishlist, name='add-to-wishlist'),
     path('delete-from-wishlist/', delete_from_wishlist, name='delete-from-wishlist'),
     path('wishlist/', gamer_wishlist, name='wishlist'),
+    path('wishlist/on-sale/', wishlist_on_sale, name='wishlist-on-sale'),
 ]
@@ -1,15 +1,47 @@
+import math
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import StreamingHttpResponse
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, BasePermission
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework_simplejwt.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.tokens import AccessToken
-from egames.models import Game, Role, Staff, Gamer, Genre, Purchase, Library, Friend, Wishlist, Review
-from .serializers import (GameSerializer, StaffSerializer,
+from egames.cache import bump_catalog_version, bump_version, cached_response, gamer_scope
+from egames.campaigns import apply_campaign_prices, campaign_game_ids, rebuild_price_timeline
+from egames.catalog_io import FORMATS, detect_format, export_games, import_games, iter_records, iter_text_lines
+from egames.friends import (MAX_SUGGESTIONS_LIMIT, SUGGESTIONS_LIMIT, active_usernames, invalidate_friends,
+                            mutual_friend_ids, suggest_friends)
+from egames.images import store_cover
+from egames.models import (Game, Role, Staff, Gamer, Genre, Purchase, Library, Friend, Wishlist, Review,
+                           DiscountCampaign, GamePriceWindow, WalletEntry, WishlistPriceDrop)
+from egames.ownership import (LIBRARY, MAX_OWNERSHIP_BATCH, WISHLIST, add_game_ids, filter_game_ids, has_game,
+                              invalidate)
+from egames.price_drops import record_price_changes
+from egames.pricing import reprice_games
+from egames.purchases import (MAX_CART_SIZE, PURCHASED, AlreadyOwned, GameNotAvailable, InsufficientFunds,
+                              buy_game, checkout_cart)
+from egames.sales import (MAX_REPORT_DAYS, MAX_TOP_SELLERS_LIMIT, REPORT_ORDERINGS, TOP_SELLERS_LIMIT,
+                          revenue_by_genre, sales_series, top_sellers)
+from egames.search import index_games, index_genre_games, search_games
+from egames.tagging import find_missing, parse_tagging_pairs, tag_games, untag_games
+from egames.wallet import deposit, from_cents, ledger_balance_cents, to_cents
+from .serializers import (GameSerializer, GameListSerializer, StaffSerializer,
                           RoleSerializer, GamerSerializer,
-                          GenreSerializer, PurchaseSerializer, LibrarySerializer,
+                          GenreSerializer, LibrarySerializer,
                           GamerSearchSerializer, SelfGamerSerializer, EditGamerProfileSerializer, SelfStaffSerializer,
-                          EditStaffProfileSerializer, WishlistSerializer, ReviewSerializer)
+                          EditStaffProfileSerializer, WishlistSerializer, ReviewSerializer,
+                          DiscountCampaignSerializer, GamePriceWindowSerializer, WalletEntrySerializer,
+                          PurchaseRowSerializer, WishlistPriceDropSerializer)
+from .cards import get_game_cards, refresh_game_cards
+from .conditional import catalog_condition, gamer_condition
+from .fields import InvalidFields, field_options, has_field_params, sparse_queryset
+from .filters import apply_game_filters, game_facets, parse_date_range, parse_day_range, parse_game_filters
+from .idempotency import idempotent
+from .pagination import get_page_size, paginate_keyset
+from .rendering import raw_json_response
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,18 +59,108 @@ def has_specific_role(allowed_roles):
     return HasSpecificRolePermission
 
 
+def invalid_fields_response(user, error):
+    logger.error(f'Пользователь {user.username} запросил неизвестные поля ответа')
+    return Response({'message': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def sparse_data(request, serializer_class, queryset):
+    options = field_options(request)
+    return serializer_class(sparse_queryset(serializer_class, queryset, **options), many=True, **options).data
+
+
 # ================================== ИГРЫ ==================================
+def cover_fields(request):
+    cover = request.FILES.get('cover_image')
+    if cover is None:
+        return {}
+    cover_hash, cover_path = store_cover(cover)
+    return {'cover_image': cover_path, 'cover_hash': cover_hash}
+
+
+def invalid_cover_response(user):
+    logger.error(f'Не удалось обработать обложку игры, загруженную пользователем {user.username}')
+    return Response({'message': 'Не удалось обработать изображение обложки.'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+GAME_ORDERINGS = {
+    'id': ('id',),
+    'rating': ('rating_avg', 'id'),
+    '-rating': ('-rating_avg', '-id'),
+}
+
+
 @api_view(["GET"])
+@catalog_condition
+@cached_response()
 def get_all_games(request):
     user = request.user
-    games = Game.objects.all()
-    serializer = GameSerializer(games, many=True)
+    ordering = GAME_ORDERINGS.get(request.query_params.get('ordering', 'id'))
+    if ordering is None:
+        logger.error(f'Пользователь {user.username} указал неизвестную сортировку списка игр')
+        return Response({'message': f'Допустимые значения ordering: {", ".join(GAME_ORDERINGS)}.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    sparse = has_field_params(request)
+    ordering_fields = {field.lstrip('-') for field in ordering}
+    try:
+        if sparse:
+            games = sparse_queryset(GameSerializer, Game.objects.all(), extra=ordering_fields, **field_options(request))
+        else:
+            games = Game.objects.only(*ordering_fields)
+    except InvalidFields as e:
+        return invalid_fields_response(user, e)
+    try:
+        filters = parse_game_filters(request.query_params)
+        games = apply_game_filters(games, filters)
+        games, next_cursor = paginate_keyset(games, request, ordering)
+    except ValueError:
+        logger.error(f'Пользователь {user.username} передал некорректные параметры списка игр')
+        return Response({'message': 'Параметры фильтрации, cursor и page_size указаны некорректно.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if sparse:
+        items = GameSerializer(games, many=True, **field_options(request)).data
+    else:
+        cards = get_game_cards([game.id for game in games])
+        items = [cards[game.id] for game in games]
+    data = {'games': items, 'next_cursor': next_cursor}
+    if not request.query_params.get('cursor'):
+        data['facets'] = game_facets(filters)
     logger.info(f'Получение списка игр пользователем {user.username}')
-    return Response({'games': serializer.data})
+    return raw_json_response(data)
+
+
+def search_games_by_text(request, query):
+    user = request.user
+    try:
+        page_size = get_page_size(request)
+        page = max(1, int(request.query_params.get('page', 1)))
+    except ValueError:
+        logger.error(f'Пользователь {user.username} передал некорректные параметры пагинации поиска')
+        return Response({'message': 'Параметры page и page_size должны содержать только числа.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    options = field_options(request)
+    try:
+        games = sparse_queryset(GameListSerializer, Game.objects.all(), **options)
+    except InvalidFields as e:
+        return invalid_fields_response(user, e)
+    results = search_games(query, page_size + 1, (page - 1) * page_size)
+    has_next = len(results) > page_size
+    results = results[:page_size]
+    games = games.in_bulk([game_id for game_id, _ in results])
+    results = [(game_id, score) for game_id, score in results if game_id in games]
+    data = GameListSerializer([games[game_id] for game_id, _ in results], many=True, **options).data
+    for item, (_, score) in zip(data, results):
+        item['score'] = score
+    logger.info(f'Полнотекстовый поиск игр пользователем {user.username}')
+    return Response({'games': data, 'page': page, 'next_page': page + 1 if has_next else None})
 
 
 @api_view(["GET"])
+@cached_response()
 def search_game(request):
+    query = request.query_params.get('q')
+    if query is not None:
+        return search_games_by_text(request, query)
     game_id = request.data.get('game_id', None)
     user = request.user
     if game_id is None:
@@ -52,14 +174,16 @@ def search_game(request):
         return Response({'message': 'Поле game_id должно содержать только числа.'},
                         status=status.HTTP_400_BAD_REQUEST)
     if game_id is not None:
-        try:
-            game = Game.objects.get(id=game_id, is_deleted=False)
-            serializer = GameSerializer(game)
-            return Response(serializer.data)
-        except Game.DoesNotExist:
+        if not Game.objects.filter(id=game_id, is_deleted=False).exists():
             logger.error(f'Попытка поиска несуществующей игры пользователем {user.username}')
             return Response({'massage': 'Такой игры нет, либо она была удалена'},
                             status=status.HTTP_404_NOT_FOUND)
+        if has_field_params(request):
+            try:
+                return Response(sparse_data(request, GameSerializer, Game.objects.filter(id=game_id))[0])
+            except InvalidFields as e:
+                return invalid_fields_response(user, e)
+        return raw_json_response(get_game_cards([game_id])[game_id])
     else:
         logger.error(f'Пользователем {user.username} не предоставлена информация для поиска игры')
         return Response({'massage': 'Вы не указали игру, которую хотите найти'},
@@ -73,11 +197,20 @@ def create_game(request):
     serializer = GameSerializer(data=request.data)
     if serializer.is_valid():
         title = serializer.validated_data.get('title')
-        if Game.objects.filter(title=title).exists():
+        try:
+            covers = cover_fields(request)
+        except (OSError, ValueError):
+            return invalid_cover_response(user)
+        try:
+            with transaction.atomic():
+                game = serializer.save(**covers)
+        except IntegrityError:
             logger.error(f'Попытка создания игры, которая уже есть в базе пользователем {user.username}')
             return Response({'massage': f'Игра {title} уже есть в вашей базе данных'},
                             status=status.HTTP_400_BAD_REQUEST)
-        serializer.save()
+        index_games([game.id])
+        refresh_game_cards([game.id])
+        bump_catalog_version()
         logger.info(f'Пользователем {user.username} игра {title} успешно создана')
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     logger.error(f'Пользователем {user.username} не предоставлена информация для создания игры')
@@ -96,13 +229,23 @@ def update_game(request, id):
                         status=status.HTTP_404_NOT_FOUND)
     serializer = GameSerializer(game, data=request.data, partial=True)
     if serializer.is_valid():
-        new_game_title = serializer.validated_data.get('title')
-        existing_game = Game.objects.filter(title=new_game_title, is_deleted=False).exclude(id=id).first()
-        if existing_game:
+        old_final_price = game.final_price
+        try:
+            covers = cover_fields(request)
+        except (OSError, ValueError):
+            return invalid_cover_response(user)
+        try:
+            with transaction.atomic():
+                game = serializer.save(**covers)
+                record_price_changes([(id, old_final_price, game.final_price)])
+        except IntegrityError:
             logger.error(f'Пользователь {user.username} пытался создать игру с уже существующим названием')
             return Response({'message': 'Игра с таким названием уже существует.'},
                             status=status.HTTP_409_CONFLICT)
-        serializer.save()
+        index_games([id])
+        rebuild_price_timeline([id])
+        refresh_game_cards([id])
+        bump_catalog_version()
         logger.info(f'Пользователем {user.username} игра с ID: {id} успешно обновлена')
         return Response(serializer.data)
     logger.error(f'Ошибка при обновлении игры с ID: {id} пользователем {user.username}')
@@ -132,6 +275,9 @@ def delete_game(request):
                         status=status.HTTP_404_NOT_FOUND)
     game.is_deleted = True
     game.save()
+    index_games([game_id])
+    refresh_game_cards([game_id])
+    bump_catalog_version()
     logger.info(f'Пользователем {user.username} игра с ID: {game_id} успешно удалена')
     return Response({'massage': f'Игра с ID: {game_id} успешно удалена.'},
                     status=status.HTTP_204_NO_CONTENT)
@@ -160,12 +306,270 @@ def restore_game(request):
                         status=status.HTTP_404_NOT_FOUND)
     game.is_deleted = False
     game.save()
+    index_games([game_id])
+    refresh_game_cards([game_id])
+    bump_catalog_version()
     logger.info(f'Пользователем {user.username} игра с ID: {game_id} успешно восстановлена из удаленных')
     return Response({'message': f'Игра с ID: {game_id} успешно восстановлена.'},
                     status=status.HTTP_200_OK)
 
 
+# ================================== МАССОВОЕ ИЗМЕНЕНИЕ СКИДОК ==================================
+@api_view(["POST"])
+@permission_classes([has_specific_role(['admin', 'editor'])])
+def reprice_games_view(request):
+    user = request.user
+    discount_percent = request.data.get('discount_percent')
+    genre_id = request.data.get('genre_id')
+    game_ids = request.data.get('game_ids')
+    reprice_all = request.data.get('all') is True
+    if discount_percent is None or [genre_id is not None, game_ids is not None, reprice_all].count(True) != 1:
+        logger.error(f'Пользователь {user.username} не указал скидку или набор игр для изменения цен')
+        return Response({'message': 'Укажите discount_percent и ровно одно из полей: genre_id, game_ids или all.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if game_ids is not None and not isinstance(game_ids, list):
+        logger.error(f'Пользователь {user.username} передал game_ids не списком')
+        return Response({'message': 'Поле game_ids должно быть списком идентификаторов игр.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        discount_percent = float(discount_percent)
+        games = Game.objects.filter(is_deleted=False)
+        if genre_id is not None:
+            games = games.filter(genre=int(genre_id))
+        elif game_ids is not None:
+            games = games.filter(id__in=[int(game_id) for game_id in game_ids])
+    except (TypeError, ValueError):
+        logger.error(f'Пользователь {user.username} попытался ввести в числовое поле запроса иной тип данных')
+        return Response({'message': 'Поля discount_percent, genre_id и game_ids должны содержать только числа.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not 0 <= discount_percent <= 100:
+        logger.error(f'Пользователь {user.username} указал скидку вне диапазона от 0 до 100')
+        return Response({'message': 'Скидка должна быть в диапазоне от 0 до 100.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    changed = reprice_games(games, discount_percent)
+    refresh_game_cards(changed)
+    bump_catalog_version()
+    logger.info(f'Пользователем {user.username} изменены цены {len(changed)} игр')
+    return Response({'message': f'Скидка {discount_percent}% применена.', 'changed': len(changed)})
+
+
+# ================================== СКИДОЧНЫЕ КАМПАНИИ ==================================
+def apply_campaigns_to_games(game_ids, refresh_all=False):
+    """
+    Пересчитывает цены по кампаниям и перерисовывает карточки игр с изменившейся ценой.
+    С refresh_all перерисовываются карточки всех game_ids (например, после смены жанров).
+    """
+    rebuild_price_timeline(game_ids)
+    changed = apply_campaign_prices()
+    refresh_game_cards(set(changed) | set(game_ids) if refresh_all else changed)
+    if changed:
+        bump_catalog_version()
+
+
+@api_view(["GET"])
+@permission_classes([has_specific_role(['admin', 'editor', 'viewer'])])
+def get_all_campaigns(request):
+    user = request.user
+    campaigns = DiscountCampaign.objects.prefetch_related('games', 'genres').order_by('-starts_at')
+    serializer = DiscountCampaignSerializer(campaigns, many=True)
+    logger.info(f'Запрос списка скидочных кампаний для {user.username}')
+    return Response({'campaigns': serializer.data})
+
+
+@api_view(["POST"])
+@permission_classes([has_specific_role(['admin'])])
+def create_campaign(request):
+    user = request.user
+    serializer = DiscountCampaignSerializer(data=request.data)
+    if serializer.is_valid():
+        campaign = serializer.save()
+        apply_campaigns_to_games(campaign_game_ids(campaign))
+        logger.info(f'Пользователем {user.username} создана скидочная кампания {campaign.title}')
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    logger.error(f'Неверные данные, предоставленные для создания кампании пользователем {user.username}')
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(["DELETE"])
+@permission_classes([has_specific_role(['admin'])])
+def delete_campaign(request):
+    user = request.user
+    campaign_id = request.data.get('campaign_id', None)
+    if campaign_id is None:
+        logger.error(f'Пользователь {user.username} не указал обязательный параметр запроса')
+        return Response({'message': 'Необходимо указать campaign_id для удаления.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        campaign_id = int(campaign_id)
+    except ValueError:
+        logger.error(f'Пользователь {user.username} попытался ввести в числовое поле запроса иной тип данных')
+        return Response({'message': 'Поле campaign_id должно содержать только числа.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        campaign = DiscountCampaign.objects.get(id=campaign_id, is_deleted=False)
+    except DiscountCampaign.DoesNotExist:
+        logger.error(f'Попытка поиска несуществующей кампании пользователем {user.username}')
+        return Response({'message': 'Такой кампании нет, либо она была удалена'},
+                        status=status.HTTP_404_NOT_FOUND)
+    campaign.is_deleted = True
+    campaign.save()
+    apply_campaigns_to_games(campaign_game_ids(campaign))
+    logger.info(f'Пользователем {user.username} удалена скидочная кампания с ID: {campaign_id}')
+    return Response({'message': f'Кампания с ID: {campaign_id} успешно удалена.'},
+                    status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(["GET"])
+def game_price_timeline(request, id):
+    user = request.user
+    if not Game.objects.filter(id=id, is_deleted=False).exists():
+        logger.error(f'Попытка поиска несуществующей игры пользователем {user.username}')
+        return Response({'message': 'Такой игры нет, либо она была удалена'},
+                        status=status.HTTP_404_NOT_FOUND)
+    windows = GamePriceWindow.objects.filter(game_id=id).order_by('starts_at')
+    serializer = GamePriceWindowSerializer(windows, many=True)
+    return Response({'game_id': id, 'timeline': serializer.data})
+
+
+# ================================== ОТЧЕТЫ ПО ПРОДАЖАМ ==================================
+SALES_REPORT_DEFAULT_DAYS = 7
+
+
+def report_period(request):
+    return parse_day_range(request.query_params, SALES_REPORT_DEFAULT_DAYS, MAX_REPORT_DAYS)
+
+
+def report_error_response(user, error):
+    logger.error(f'Пользователь {user.username} передал некорректные параметры отчета по продажам')
+    return Response({'message': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([has_specific_role(['admin'])])
+def sales_top_sellers(request):
+    user = request.user
+    order = request.query_params.get('order', 'purchases')
+    limit = str(request.query_params.get('limit', TOP_SELLERS_LIMIT))
+    try:
+        day_from, day_to = report_period(request)
+        if order not in REPORT_ORDERINGS:
+            raise ValueError(f'order должен быть одним из: {", ".join(REPORT_ORDERINGS)}')
+        if not limit.isdigit() or not 0 < int(limit) <= MAX_TOP_SELLERS_LIMIT:
+            raise ValueError(f'limit должен быть числом от 1 до {MAX_TOP_SELLERS_LIMIT}')
+        limit = int(limit)
+    except ValueError as e:
+        return report_error_response(user, e)
+    logger.info(f'Запрос самых продаваемых игр пользователем {user.username}')
+    return Response({'date_from': day_from, 'date_to': day_to,
+                     'games': top_sellers(day_from, day_to, order, limit)})
+
+
+@api_view(['GET'])
+@permission_classes([has_specific_role(['admin'])])
+def sales_by_genre(request):
+    user = request.user
+    try:
+        day_from, day_to = report_period(request)
+    except ValueError as e:
+        return report_error_response(user, e)
+    logger.info(f'Запрос выручки по жанрам пользователем {user.username}')
+    return Response({'date_from': day_from, 'date_to': day_to, 'genres': revenue_by_genre(day_from, day_to)})
+
+
+@api_view(['GET'])
+@permission_classes([has_specific_role(['admin'])])
+def sales_timeline(request):
+    user = request.user
+    game_id = request.query_params.get('game_id')
+    try:
+        day_from, day_to = report_period(request)
+        if game_id is not None:
+            if not game_id.isdigit():
+                raise ValueError('Поле game_id должно содержать только числа.')
+            game_id = int(game_id)
+    except ValueError as e:
+        return report_error_response(user, e)
+    logger.info(f'Запрос продаж по дням пользователем {user.username}')
+    return Response({'date_from': day_from, 'date_to': day_to, 'game_id': game_id,
+                     'series': sales_series(day_from, day_to, game_id)})
+
+
+# ================================== МАССОВЫЙ ИМПОРТ/ЭКСПОРТ ИГР ==================================
+@api_view(["POST"])
+@permission_classes([has_specific_role(['admin'])])
+def import_games_view(request):
+    user = request.user
+    upload = request.FILES.get('file')
+    if upload is None:
+        logger.error(f'Пользователь {user.username} не приложил файл для импорта игр')
+        return Response({'message': 'Необходимо приложить файл каталога в поле file.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    file_format = request.query_params.get('file_format') or detect_format(upload.name)
+    if file_format not in FORMATS:
+        logger.error(f'Пользователь {user.username} указал неподдерживаемый формат импорта')
+        return Response({'message': f'Поддерживаемые форматы: {", ".join(FORMATS)}.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    report = import_games(iter_records(iter_text_lines(upload), file_format))
+    logger.info(f'Пользователем {user.username} импортировано игр: {report["created"]}')
+    return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@permission_classes([has_specific_role(['admin', 'editor', 'viewer'])])
+def export_games_view(request):
+    user = request.user
+    file_format = request.query_params.get('file_format', 'ndjson')
+    if file_format not in FORMATS:
+        logger.error(f'Пользователь {user.username} указал неподдерживаемый формат экспорта')
+        return Response({'message': f'Поддерживаемые форматы: {", ".join(FORMATS)}.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(export_games(file_format), content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="games.{file_format}"'
+    logger.info(f'Экспорт каталога игр пользователем {user.username}')
+    return response
+
+
 # ================================== ДОБАВЛЕНИЕ ОТЗЫВА К ИГРЕ ==================================
+REVIEW_ORDERINGS = {
+    '-date': ('-date', '-id'),
+    'date': ('date', 'id'),
+    '-rating': ('-rating', '-id'),
+    'rating': ('rating', 'id'),
+}
+
+
+@api_view(["GET"])
+@catalog_condition
+@cached_response()
+def game_reviews(request, id):
+    user = request.user
+    ordering = REVIEW_ORDERINGS.get(request.query_params.get('ordering', '-date'))
+    if ordering is None:
+        logger.error(f'Пользователь {user.username} указал неизвестную сортировку отзывов')
+        return Response({'message': f'Допустимые значения ordering: {", ".join(REVIEW_ORDERINGS)}.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not Game.objects.filter(id=id, is_deleted=False).exists():
+        logger.error(f'Попытка поиска несуществующей игры пользователем {user.username}')
+        return Response({'massage': 'Такой игры нет, либо она была удалена'},
+                        status=status.HTTP_404_NOT_FOUND)
+    options = field_options(request)
+    try:
+        reviews = sparse_queryset(ReviewSerializer, Review.objects.filter(game_id=id, is_deleted=False),
+                                  extra={field.lstrip('-') for field in ordering}, **options)
+    except InvalidFields as e:
+        return invalid_fields_response(user, e)
+    try:
+        reviews, next_cursor = paginate_keyset(reviews, request, ordering)
+    except ValueError:
+        logger.error(f'Пользователь {user.username} передал некорректные параметры ленты отзывов')
+        return Response({'message': 'Параметры cursor и page_size указаны некорректно.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    serializer = ReviewSerializer(reviews, many=True, **options)
+    logger.info(f'Получение отзывов к игре {id} пользователем {user.username}')
+    return Response({'game_id': id, 'reviews': serializer.data, 'next_cursor': next_cursor})
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def add_review_to_game(request, id):
@@ -183,16 +587,20 @@ def add_review_to_game(request, id):
     except Game.DoesNotExist:
         logger.error(f'Попытка поиска несуществующей игры пользователем {user.username}')
         return Response({'massage': 'Такой игры нет, либо она была удалена'}, status=404)
-    existing_review = Review.objects.filter(game=game, gamer=gamer)
-    if existing_review.exists():
+    if rating > 100 or rating < 0:
+        logger.error(f'Пользователь {user.username} пытался поставить рейтинг выше 100%')
+        return Response({'massage': 'Рейтинг не может превышать 100% или быть отрицательным!'}, status=400)
+    try:
+        with transaction.atomic():
+            review = Review.objects.create(game=game, gamer=gamer, rating=rating, comment=comment)
+            Game.apply_review_change(game.id, 1, rating)
+    except IntegrityError:
         logger.warning(f'Попытка повторной публикации пользователем {user.username} отзыва на игру')
         return Response({'massage': f'Отзыв на игру c ID: {id} уже был опубликован вами ранее. '
                                     f'Вы можете воспользоваться функцией редактирования отзыва или удаления'},
                         status=400)
-    if rating > 100 or rating < 0:
-        logger.error(f'Пользователь {user.username} пытался поставить рейтинг выше 100%')
-        return Response({'massage': 'Рейтинг не может превышать 100% или быть отрицательным!'}, status=400)
-    review = Review.objects.create(game=game, gamer=gamer, rating=rating, comment=comment)
+    refresh_game_cards([game.id])
+    bump_catalog_version()
     logger.info(f'Отзыв для игры {id} от геймера {user.username} успешно добавлен')
     serializer = ReviewSerializer(review)
     return Response(serializer.data)
@@ -227,9 +635,14 @@ def edit_own_review(request, id):
     if rating > 100 or rating < 0:
         logger.error(f'Пользователь {user.username} пытался поставить рейтинг выше 100%')
         return Response({'massage': 'Рейтинг не может превышать 100% или быть отрицательным'}, status=400)
-    review.rating = rating
-    review.comment = comment
-    review.save()
+    with transaction.atomic():
+        old_rating = Review.objects.select_for_update().values_list('rating', flat=True).get(id=review.id)
+        Game.apply_review_change(game.id, 0, rating - old_rating)
+        review.rating = rating
+        review.comment = comment
+        review.save()
+    refresh_game_cards([game.id])
+    bump_catalog_version()
     logger.info(f'Отзыв для игры с ID: {id} от геймера {user.username} успешно отредактирован')
     serializer = ReviewSerializer(review)
     return Response(serializer.data)
@@ -255,7 +668,12 @@ def delete_own_review(request, id):
         logger.error(f'Отзыв от геймера {user.username} к игре с ID: {id} не найден')
         return Response({'massage': f'Отзыв от геймера {user.username} к игре с ID: {id} не найден'},
                         status=404)
-    review.delete()
+    with transaction.atomic():
+        deleted, _ = Review.objects.filter(id=review.id).delete()
+        if deleted:
+            Game.apply_review_change(game.id, -1, -review.rating)
+    refresh_game_cards([game.id])
+    bump_catalog_version()
     logger.info(f'Отзыв для игры с ID: {id} от геймера {user.username} успешно удален')
     return Response({'massage': f'Ваш отзыв на игру с ID: {id} успешно удален'})
 
@@ -401,11 +819,13 @@ def create_staff(request):
 @api_view(["GET"])
 @permission_classes([has_specific_role(['admin', 'editor', 'viewer'])])
 def get_all_staff(request):
-    staff = Staff.objects.all()
-    serializer = StaffSerializer(staff, many=True)
     user = request.user
+    try:
+        data = sparse_data(request, StaffSerializer, Staff.objects.all())
+    except InvalidFields as e:
+        return invalid_fields_response(user, e)
     logger.info(f'Запрос списка сотрудников для {user.username}')
-    return Response(serializer.data)
+    return Response(data)
 
 
 @api_view(['GET'])
@@ -585,12 +1005,14 @@ def create_gamer(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_all_gamers(request):
-    gamers = Gamer.objects.all()
-    serializer = GamerSerializer(gamers, many=True)
     user = request.user
+    try:
+        data = sparse_data(request, GamerSerializer, Gamer.objects.all())
+    except InvalidFields as e:
+        return invalid_fields_response(user, e)
     logger.info(f'Запрос списка геймеров для {user.username}')
     logger.info(f'Получение списка геймеров')
-    return Response(serializer.data)
+    return Response(data)
 
 
 @api_view(["DELETE"])
@@ -652,10 +1074,13 @@ def restore_gamer(request):
 @permission_classes([IsAuthenticated])
 def gamer_profile(request):
     gamer = request.user.gamer
-    serializer = SelfGamerSerializer(gamer)
     user = request.user
+    try:
+        data = sparse_data(request, SelfGamerSerializer, Gamer.objects.filter(id=gamer.id))
+    except InvalidFields as e:
+        return invalid_fields_response(user, e)
     logger.info(f'Получение доступа к профилю пользователем {user.username}')
-    return Response(serializer.data)
+    return Response(data[0])
 
 
 @api_view(['PUT'])
@@ -670,7 +1095,12 @@ def edit_gamer_profile(request):
             logger.error(f'Попытка изменения логина на уже существующий пользователем {user.username}')
             return Response({'massage': f'Пользователь с логином {gamer.username} уже существует.'},
                             status=400)
+        old_username = gamer.username
         serializer.save()
+        if gamer.username != old_username:
+            # Логин автора отзыва хранится в карточках игр
+            refresh_game_cards(Review.objects.filter(gamer=gamer).values_list('game_id', flat=True))
+            bump_catalog_version()
         logger.info(f'Пользователь {user.username} успешно обновил профиль')
         return Response({'massage': 'Ваш профиль успешно обновлен.'})
     logger.error(f'Неверные данные, предоставленные для обновления профиля пользователем {user.username}')
@@ -694,13 +1124,14 @@ def search_gamer(request):
                         status=status.HTTP_400_BAD_REQUEST)
     if gamer_id is not None:
         try:
-            gamer = Gamer.objects.get(id=gamer_id, is_deleted=False)
-            serializer = GamerSearchSerializer(gamer)
-            return Response(serializer.data)
-        except Gamer.DoesNotExist:
+            data = sparse_data(request, GamerSearchSerializer, Gamer.objects.filter(id=gamer_id, is_deleted=False))
+        except InvalidFields as e:
+            return invalid_fields_response(user, e)
+        if not data:
             logger.error(f'Попытка поиска геймера пользователем {user.username}')
             return Response({'massage': 'Геймера с таким ID нет, либо его профиль удален!'},
                             status=status.HTTP_404_NOT_FOUND)
+        return Response(data[0])
     else:
         logger.error(f'Неверные данные, предоставленные для поиска геймера пользователем {user.username}')
         return Response({'massage': 'Вы не ввели данные пользователя'}, status=status.HTTP_400_BAD_REQUEST)
@@ -708,6 +1139,7 @@ def search_gamer(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def wallet_deposit(request):
     gamer = request.user.gamer
     amount = request.data.get('amount')
@@ -720,14 +1152,36 @@ def wallet_deposit(request):
     except ValueError:
         logger.error(f'{user.username} ввел не цифры для пополнения кошелька')
         return Response({'massage': 'Вводить нужно только цифры'}, status=status.HTTP_400_BAD_REQUEST)
+    if not math.isfinite(amount):
+        logger.error(f'{user.username} пытался пополнить кошелек на бесконечную или нечисловую сумму')
+        return Response({'massage': 'Сумма пополнения должна быть конечным числом'},
+                        status=status.HTTP_400_BAD_REQUEST)
     if amount < 0:
         logger.error(f'{user.username} пытался ввести отрицательное число для пополнения баланса кошелька')
         return Response({'massage': 'Пополнение баланса возможно только на положительное значение'})
-    gamer.wallet += amount
-    gamer.save()
+    amount = from_cents(to_cents(amount))
+    balance = deposit(gamer.id, amount)
     logger.info(f'Успешное пополнение кошелька пользователем {user.username}')
     return Response({'massage': f'Баланс вашего кошелька пополнен на {amount} '
-                                f'ecoins и теперь равен {gamer.wallet} ecoins'})
+                                f'ecoins и теперь равен {balance} ecoins'})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def wallet_history(request):
+    gamer = request.user.gamer
+    user = request.user
+    options = field_options(request)
+    try:
+        entries = sparse_queryset(WalletEntrySerializer, WalletEntry.objects.filter(gamer=gamer), **options)
+        entries, next_cursor = paginate_keyset(entries, request, ('-id',))
+    except ValueError as e:
+        logger.error(f'Пользователь {user.username} передал некорректные параметры истории кошелька')
+        return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    serializer = WalletEntrySerializer(entries, many=True, **options)
+    logger.info(f'Получение истории кошелька пользователем {user.username}')
+    return Response({'balance': from_cents(ledger_balance_cents(gamer.id)), 'entries': serializer.data,
+                     'next_cursor': next_cursor})
 
 
 # ================================== ДОБАВЛЕНИЕ/УДАЛЕНИЕ ГЕЙМЕРА ИЗ СПИСКА ДРУЗЕЙ ==================================
@@ -751,12 +1205,15 @@ def add_friend(request):
             current_gamer = request.user.gamer
             friend = Gamer.objects.get(id=friend_id, is_deleted=False)
 
-            if Friend.objects.filter(gamer=current_gamer, friend=friend).exists():
-                logger.error(f'Попытка пользователем {user.username} добавления в друзья уже своего друга')
-                return Response({'massage': f'Геймер {friend.username} уже у вас в друзьях'},
-                                status=status.HTTP_400_BAD_REQUEST)
             if friend != current_gamer:
-                Friend.objects.create(gamer=current_gamer, friend=friend)
+                try:
+                    with transaction.atomic():
+                        Friend.objects.create(gamer=current_gamer, friend=friend)
+                        invalidate_friends(current_gamer.id)
+                except IntegrityError:
+                    logger.error(f'Попытка пользователем {user.username} добавления в друзья уже своего друга')
+                    return Response({'massage': f'Геймер {friend.username} уже у вас в друзьях'},
+                                    status=status.HTTP_400_BAD_REQUEST)
                 logger.info(f'{user.username} успешно добавил в друзья {friend.username}')
                 return Response({'massage': f'Геймер {friend.username} успешно добавлен в ваш список друзей'},
                                 status=status.HTTP_200_OK)
@@ -793,8 +1250,9 @@ def delete_friend(request):
         try:
             current_gamer = request.user.gamer
             friend = Gamer.objects.get(id=friend_id, is_deleted=False)
-            if Friend.objects.filter(gamer=current_gamer, friend=friend).exists():
-                Friend.objects.filter(gamer=current_gamer, friend=friend).delete()
+            deleted, _ = Friend.objects.filter(gamer=current_gamer, friend=friend).delete()
+            if deleted:
+                invalidate_friends(current_gamer.id)
                 logger.info(f'Геймер {friend.username} успешно удален списка друзей {user.username}')
                 return Response({'massage': f'Геймер {friend.username} успешно удален из вашего списка друзей'},
                                 status=status.HTTP_200_OK)
@@ -812,19 +1270,57 @@ def delete_friend(request):
                         status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def mutual_friends(request, id):
+    gamer = request.user.gamer
+    user = request.user
+    if not Gamer.objects.filter(id=id, is_deleted=False).exists():
+        logger.error(f'Попытка пользователем {user.username} поиска геймера')
+        return Response({'massage': 'Геймера с таким ID нет, либо его профиль удален!'},
+                        status=status.HTTP_404_NOT_FOUND)
+    common = mutual_friend_ids(gamer.id, id)
+    usernames = active_usernames(common)
+    logger.info(f'Получение общих друзей пользователем {user.username}')
+    return Response({'gamer_id': id,
+                     'friends': [{'id': friend_id, 'username': usernames[friend_id]}
+                                 for friend_id in common if friend_id in usernames]})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def friend_suggestions(request):
+    gamer = request.user.gamer
+    user = request.user
+    limit = str(request.query_params.get('limit', SUGGESTIONS_LIMIT))
+    if not limit.isdigit() or not 0 < int(limit) <= MAX_SUGGESTIONS_LIMIT:
+        logger.error(f'Пользователь {user.username} передал некорректный limit')
+        return Response({'message': f'limit должен быть числом от 1 до {MAX_SUGGESTIONS_LIMIT}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    suggestions = suggest_friends(gamer.id, int(limit))
+    logger.info(f'Получение рекомендаций друзей пользователем {user.username}')
+    return Response({'suggestions': [{'id': candidate, 'username': username, 'mutual_friends': count}
+                                     for candidate, username, count in suggestions]})
+
+
 # ================================== ЖАНРЫ ИГР ==================================
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@catalog_condition
+@cached_response()
 def get_all_genres(request):
-    genres = Genre.objects.all()
-    serializer = GenreSerializer(genres, many=True)
     user = request.user
+    try:
+        data = sparse_data(request, GenreSerializer, Genre.objects.all())
+    except InvalidFields as e:
+        return invalid_fields_response(user, e)
     logger.info(f'Запрос списка жанров от пользователя {user.username}')
-    return Response({'genres': serializer.data})
+    return Response({'genres': data})
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@cached_response()
 def search_genre(request):
     genre_id = request.data.get('genre_id', None)
     user = request.user
@@ -861,12 +1357,14 @@ def create_genre(request):
     serializer = GenreSerializer(data=request.data)
     user = request.user
     if serializer.is_valid():
-        title_genre = serializer.validated_data.get('title_genre')
-        if Genre.objects.filter(title_genre=title_genre, is_deleted=False).exists():
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
             logger.error(f'Попытка пользователя {user.username} создать уже имеющийся жанр')
             return Response({'massage': 'Такой игровой жанр уже есть в вашей базе данных'},
                             status=status.HTTP_400_BAD_REQUEST)
-        serializer.save()
+        bump_catalog_version()
         logger.info(f'Жанр создан пользователем {user.username}')
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     logger.error(f'Неверные данные, предоставленные для создания жанра (пользователь - {user.username})')
@@ -885,12 +1383,15 @@ def update_genre(request, id):
                         status=status.HTTP_404_NOT_FOUND)
     serializer = GenreSerializer(genre, data=request.data, partial=True)
     if serializer.is_valid():
-        new_genre_name = serializer.validated_data.get('title_genre')
-        existing_genre = Genre.objects.filter(title_genre=new_genre_name, is_deleted=False).exclude(id=id).first()
-        if existing_genre:
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
             return Response({'message': 'Жанр с таким названием уже существует.'},
                             status=status.HTTP_409_CONFLICT)
-        serializer.save()
+        index_genre_games(genre)
+        refresh_game_cards(genre.game.values_list('id', flat=True))
+        bump_catalog_version()
         logger.info(f'Пользователем {user.username} изменен жанр')
         return Response(serializer.data)
     logger.error(f'Неверные данные, предоставленные для изменения жанра (пользователь - {user.username}')
@@ -920,6 +1421,9 @@ def delete_genre(request):
                         status=status.HTTP_404_NOT_FOUND)
     genre.is_deleted = True
     genre.save()
+    index_genre_games(genre)
+    refresh_game_cards(genre.game.values_list('id', flat=True))
+    bump_catalog_version()
     logger.info(f'Пользователем {user.username} удален жанр')
     return Response({'massage': 'Игровой жанр успешно удален.'}, status=status.HTTP_204_NO_CONTENT)
 
@@ -946,7 +1450,16 @@ def restore_genre(request):
         return Response({'massage': 'Такого игрового жанра нет в списке удаленных!'},
                         status=status.HTTP_404_NOT_FOUND)
     genre.is_deleted = False
-    genre.save()
+    try:
+        with transaction.atomic():
+            genre.save(update_fields=['is_deleted'])
+    except IntegrityError:
+        logger.error(f'Пользователь {user.username} пытался восстановить жанр с занятым названием')
+        return Response({'massage': f'Действующий жанр {genre.title_genre} уже есть в вашей базе данных'},
+                        status=status.HTTP_409_CONFLICT)
+    index_genre_games(genre)
+    refresh_game_cards(genre.game.values_list('id', flat=True))
+    bump_catalog_version()
     logger.info(f'Пользователем {user.username} восстановлен жанр')
     return Response({'massage': 'Игровой жанр успешно восстановлен.'}, status=status.HTTP_204_NO_CONTENT)
 
@@ -980,6 +1493,9 @@ def add_genre_to_game(request):
         logger.error(f'Попытка поиска несуществующего жанра пользователем {user.username}')
         return Response({'massage': 'Жанр не найден, возможно он был удален!'}, status=404)
     genre.game.add(game)
+    index_games([game.id])
+    apply_campaigns_to_games([game.id], refresh_all=True)
+    bump_catalog_version()
     logger.info(f'Пользователем {user.username} добавлен жанр к игре')
     return Response({'massage': 'Жанр успешно добавлен к игре!'})
 
@@ -1012,13 +1528,52 @@ def delete_genre_from_game(request):
         logger.error(f'Попытка поиска несуществующего жанра пользователем {user.username}')
         return Response({'massage': 'Жанр не найден, возможно он был удален!'}, status=404)
     genre.game.remove(game)
+    index_games([game.id])
+    apply_campaigns_to_games([game.id], refresh_all=True)
+    bump_catalog_version()
     logger.info(f'Пользователем {user.username} удален жанр из игры')
     return Response({'massage': 'Жанр успешно удален из игры!'})
 
 
+def change_games_genres(request, action, result_name, message):
+    user = request.user
+    try:
+        pairs = parse_tagging_pairs(request.data)
+    except ValueError as e:
+        logger.error(f'Неверные данные для массового изменения жанров игр (пользователь - {user.username})')
+        return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    missing_games, missing_genres = find_missing(pairs)
+    if missing_games or missing_genres:
+        logger.error(f'Попытка изменить жанры несуществующих игр или жанров пользователем {user.username}')
+        return Response({'massage': 'Некоторые игры или жанры не найдены, возможно они были удалены!',
+                         'missing_game_ids': missing_games, 'missing_genre_ids': missing_genres},
+                        status=status.HTTP_404_NOT_FOUND)
+    changed = action(pairs)
+    if changed:
+        game_ids = list({game_id for game_id, _ in pairs})
+        index_games(game_ids)
+        apply_campaigns_to_games(game_ids, refresh_all=True)
+        bump_catalog_version()
+    logger.info(f'Пользователем {user.username} массово изменены жанры игр ({result_name}: {changed})')
+    return Response({'massage': message, result_name: changed})
+
+
+@api_view(['POST'])
+@permission_classes([has_specific_role(['admin', 'editor'])])
+def add_genres_to_games(request):
+    return change_games_genres(request, tag_games, 'created', 'Жанры успешно добавлены к играм!')
+
+
+@api_view(['DELETE'])
+@permission_classes([has_specific_role(['admin', 'editor'])])
+def delete_genres_from_games(request):
+    return change_games_genres(request, untag_games, 'deleted', 'Жанры успешно удалены из игр!')
+
+
 # ================================== ПОКУПКА ИГРЫ И ДОБАВЛЕНИЕ В БИБЛИОТЕКУ  ==================================
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def buy_and_add_to_library(request):
     gamer = request.user.gamer
     game_id = request.data.get('game_id')
@@ -1037,51 +1592,123 @@ def buy_and_add_to_library(request):
         logger.error(f'Попытка выбора игры для покупки пользователем {user.username}')
         return Response({'massage': 'Вы не выбрали игру для покупки!'}, status=400)
     try:
-        game = Game.objects.get(id=game_id, is_deleted=False)
-    except Game.DoesNotExist:
+        game, purchase = buy_game(gamer.id, game_id)
+    except GameNotAvailable:
         logger.error(f'Попытка поиска несуществующей игры пользователем {user.username}')
         return Response({'massage': 'Игра не найдена, возможно она была удалена!'}, status=404)
-    existing_game = Library.objects.filter(gamer=gamer, game=game).exists()
-    if existing_game:
+    except AlreadyOwned:
         logger.warning(f'Попытка покупки уже имеющейся у пользователя игры пользователем {user.username}')
         return Response({'massage': 'У вас уже есть такая игра в библиотеке'}, status=400)
-
-    if gamer.wallet < game.final_price:
+    except InsufficientFunds:
         logger.error(f'Попытка покупки игры пользователем {user.username}')
         return Response({'massage': 'Недостаточно средств на счете для покупки игры. '
                                     'Пожалуйста, пополните баланс вашего кошелька'}, status=400)
-    gamer.wallet -= game.final_price
-    gamer.save()
-    purchase = Purchase.objects.create(gamer=gamer, game=game)
-    purchase_serializer = PurchaseSerializer(purchase)
-    library_entry = Library.objects.create(gamer=gamer, game=game)
-    library_serializer = LibrarySerializer(library_entry)
+    bump_version(gamer_scope('library', gamer.id))
     logger.info(f'Пользователем {user.username} успешно приобретена игра {game.title}')
     return Response({'massage': f'Поздравляем с приобритением игры {game.title}! '
                                 f'Мы уже добавили ее в вашу библиотеку игр. '
                                 f'Посмотреть подробную информацию у покупке можно, перейдя в раздел Purchase'})
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def checkout_cart_view(request):
+    gamer = request.user.gamer
+    user = request.user
+    game_ids = request.data.get('game_ids')
+    if not isinstance(game_ids, list) or not game_ids:
+        logger.error(f'Пользователь {user.username} не указал обязательный параметр запроса')
+        return Response({'message': 'Поле game_ids должно содержать непустой список игр.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        game_ids = [int(game_id) for game_id in game_ids]
+    except (TypeError, ValueError):
+        logger.error(f'Пользователь {user.username} попытался ввести в числовое поле запроса иной тип данных')
+        return Response({'message': 'Поле game_ids должно содержать только числа.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if len(game_ids) > MAX_CART_SIZE:
+        logger.error(f'Пользователь {user.username} превысил размер корзины')
+        return Response({'message': f'В корзине может быть не более {MAX_CART_SIZE} игр.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        items, total = checkout_cart(gamer.id, game_ids)
+    except InsufficientFunds as e:
+        logger.error(f'Попытка оплаты корзины пользователем {user.username}')
+        return Response({'massage': 'Недостаточно средств на счете для покупки игр. '
+                                    'Пожалуйста, пополните баланс вашего кошелька',
+                         'total': e.args[0]}, status=400)
+    purchased = [item['game_id'] for item in items if item['status'] == PURCHASED]
+    if not purchased:
+        logger.warning(f'В корзине пользователя {user.username} нет игр, доступных для покупки')
+        return Response({'massage': 'В корзине нет игр, доступных для покупки.', 'items': items}, status=400)
+    bump_version(gamer_scope('library', gamer.id))
+    logger.info(f'Пользователем {user.username} оплачена корзина из {len(purchased)} игр')
+    return Response({'massage': f'Поздравляем с приобритением {len(purchased)} игр! '
+                                f'Мы уже добавили их в вашу библиотеку игр.',
+                     'items': items, 'total': total})
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def gamer_purchases(request):
     gamer = request.user.gamer
     user = request.user
-    purchases = Purchase.objects.filter(gamer=gamer)
-    purchase_serializer = PurchaseSerializer(purchases, many=True)
+    options = field_options(request)
+    ordering = ('-timestamp', '-id')
+    try:
+        purchases = Purchase.objects.filter(gamer=gamer, **parse_date_range(request.query_params, 'timestamp'))
+        purchases = sparse_queryset(PurchaseRowSerializer, purchases, extra={'timestamp'}, **options)
+        purchases, next_cursor = paginate_keyset(purchases, request, ordering)
+    except ValueError as e:
+        logger.error(f'Пользователь {user.username} передал некорректные параметры списка покупок')
+        return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    serializer = PurchaseRowSerializer(purchases, many=True, **options)
     logger.info(f'Получение списка покупок пользователем {user.username}')
-    return Response({'purchases': purchase_serializer.data})
+    return Response({'purchases': serializer.data, 'next_cursor': next_cursor})
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@gamer_condition('library')
 def gamer_library(request):
     gamer = request.user.gamer
     user = request.user
-    library_entries = Library.objects.filter(gamer=gamer)
-    library_serializer = LibrarySerializer(library_entries, many=True)
+    if has_field_params(request):
+        try:
+            data = sparse_data(request, LibrarySerializer, Library.objects.filter(gamer=gamer).order_by('id'))
+        except InvalidFields as e:
+            return invalid_fields_response(user, e)
+        return Response({'library': data})
+    library_entries = list(Library.objects.filter(gamer=gamer).order_by('id').values_list('id', 'game_id'))
+    cards = get_game_cards([game_id for _, game_id in library_entries])
+    data = [{'id': entry_id, 'game': cards[game_id]} for entry_id, game_id in library_entries]
     logger.info(f'Получение библиотеки игр пользователем {user.username}')
-    return Response({'library': library_serializer.data})
+    return raw_json_response({'library': data})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def gamer_ownership(request):
+    gamer = request.user.gamer
+    user = request.user
+    game_ids = request.data.get('game_ids')
+    if not isinstance(game_ids, list):
+        logger.error(f'Пользователь {user.username} не указал обязательный параметр запроса')
+        return Response({'message': 'Поле game_ids должно содержать список игр.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if len(game_ids) > MAX_OWNERSHIP_BATCH:
+        logger.error(f'Пользователь {user.username} запросил слишком много игр')
+        return Response({'message': f'За один запрос можно проверить не более {MAX_OWNERSHIP_BATCH} игр.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        game_ids = [int(game_id) for game_id in game_ids]
+    except (TypeError, ValueError):
+        logger.error(f'Пользователь {user.username} попытался ввести в числовое поле запроса иной тип данных')
+        return Response({'message': 'Поле game_ids должно содержать только числа.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    return Response({'owned': filter_game_ids(LIBRARY, gamer.id, game_ids),
+                     'wishlisted': filter_game_ids(WISHLIST, gamer.id, game_ids)})
 
 
 # ================================== ДОБАВЛЕНИЕ ИГРЫ В WISHLIST  ==================================
@@ -1104,16 +1731,17 @@ def add_game_to_wishlist(request):
     except Game.DoesNotExist:
         logger.error(f'Попытка поиска несуществующей игры пользователем {user.username}')
         return Response({'massage': 'Игра не найдена, возможно она была удалена!'}, status=404)
-    existing_game_wish = Wishlist.objects.filter(gamer=gamer, game=game).exists()
-    if existing_game_wish:
-        logger.warning(f'Попытка добавления уже имеющейся у пользователя игры в wishlist пользователем {user.username}')
-        return Response({'massage': 'У вас уже есть такая игра в wishlist'}, status=400)
-    existing_game_lib = Library.objects.filter(gamer=gamer, game=game).exists()
-    if existing_game_lib:
+    if has_game(LIBRARY, gamer.id, game.id):
         logger.warning(f'Попытка покупки уже имеющейся у пользователя игры пользователем {user.username}')
         return Response({'massage': 'У вас уже есть такая игра в библиотеке'}, status=400)
-    wishlist = Wishlist.objects.create(gamer=gamer, game=game)
-    wishlist_serializer = WishlistSerializer(wishlist)
+    try:
+        with transaction.atomic():
+            Wishlist.objects.create(gamer=gamer, game=game)
+    except IntegrityError:
+        logger.warning(f'Попытка добавления уже имеющейся у пользователя игры в wishlist пользователем {user.username}')
+        return Response({'massage': 'У вас уже есть такая игра в wishlist'}, status=400)
+    add_game_ids(WISHLIST, gamer.id, [game.id])
+    bump_version(gamer_scope('wishlist', gamer.id))
     logger.info(f'Пользователем {user.username} успешно добавлена в wishlist игра {game.title}')
     return Response({'massage': f'Вы добавили игру {game.title} в ваш wishlist! '
                                 f'Не откладывайте покупку надолго!'})
@@ -1143,6 +1771,9 @@ def delete_from_wishlist(request):
     try:
         wishlist_item = Wishlist.objects.get(gamer=gamer, game=game)
         wishlist_item.delete()
+        WishlistPriceDrop.objects.filter(gamer=gamer, game=game).delete()
+        invalidate(WISHLIST, gamer.id)
+        bump_version(gamer_scope('wishlist', gamer.id))
         logger.info(f'Пользователем {user.username} успешно удалена из wishlist игра {game.title}')
         return Response({'massage': f'Игра {game.title} успешно удалена из вашего wishlist!'})
     except Wishlist.DoesNotExist:
@@ -1152,10 +1783,37 @@ def delete_from_wishlist(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@gamer_condition('wishlist')
 def gamer_wishlist(request):
     gamer = request.user.gamer
     user = request.user
-    wishlist = Wishlist.objects.filter(gamer=gamer)
-    wishlist_serializer = WishlistSerializer(wishlist, many=True)
+    if has_field_params(request):
+        try:
+            data = sparse_data(request, WishlistSerializer, Wishlist.objects.filter(gamer=gamer).order_by('id'))
+        except InvalidFields as e:
+            return invalid_fields_response(user, e)
+        return Response({'Wishlist': data})
+    wishlist = list(Wishlist.objects.filter(gamer=gamer).order_by('id').values_list('id', 'game_id'))
+    cards = get_game_cards([game_id for _, game_id in wishlist])
+    data = [{'id': item_id, 'gamer': gamer.id, 'game': cards[game_id]} for item_id, game_id in wishlist]
     logger.info(f'Попытка получения wishlist пользователем {user.username}')
-    return Response({'Wishlist': wishlist_serializer.data})
+    return raw_json_response({'Wishlist': data})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def wishlist_on_sale(request):
+    gamer = request.user.gamer
+    user = request.user
+    # Уведомления, цена по которым с тех пор вернулась к прежней, не показываются до очередного разбора журнала
+    drops = (WishlistPriceDrop.objects.filter(gamer=gamer, game__is_deleted=False,
+                                              game__final_price__lt=F('old_price'))
+             .select_related('game').only('id', 'game__title', 'game__final_price', 'old_price', 'created_at'))
+    try:
+        drops, next_cursor = paginate_keyset(drops, request, ('-created_at', '-id'))
+    except ValueError as e:
+        logger.error(f'Пользователь {user.username} передал некорректные параметры списка скидок')
+        return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    serializer = WishlistPriceDropSerializer(drops, many=True)
+    logger.info(f'Получение игр из wishlist со сниженной ценой пользователем {user.username}')
+    return Response({'on_sale': serializer.data, 'next_cursor': next_cursor})
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+CATALOG_SCOPE = 'catalog'
+SHARED_CACHE_TIMEOUT = 300
+LOCAL_CACHE_MAX_ENTRIES = 1024
+LOCAL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+BUILD_LOCK_TIMEOUT = 10
+BUILD_WAIT_TIMEOUT = 2
+BUILD_WAIT_STEP = 0.05
+
+logger = logging.getLogger(__name__)
+
+
+# ================================== ВЕРСИИ ДАННЫХ ==================================
+def _version_key(scope):
+    return f'version:{scope}'
+
+
+def get_version(scope):
+    version = cache.get(_version_key(scope))
+    if version is None:
+        # Начальная версия берется от текущего времени, чтобы после вытеснения
+        # ключа из кэша версия не совпала ни с одной из выданных ранее
+        cache.add(_version_key(scope), time.time_ns() // 1000, timeout=None)
+        version = cache.get(_version_key(scope))
+    return version
+
+
+def _modified_key(scope):
+    return f'modified:{scope}'
+
+
+def get_last_modified(scope):
+    modified = cache.get(_modified_key(scope))
+    if modified is None:
+        # Время изменения неизвестно (ключ вытеснен): считаем, что данные изменились сейчас
+        cache.add(_modified_key(scope), time.time(), timeout=None)
+        modified = cache.get(_modified_key(scope))
+    return datetime.fromtimestamp(modified, tz=timezone.utc)
+
+
+def _bump_version(scope):
+    cache.set(_modified_key(scope), time.time(), timeout=None)
+    try:
+        cache.incr(_version_key(scope))
+    except ValueError:
+        get_version(scope)
+
+
+def bump_version(scope):
+    transaction.on_commit(lambda: _bump_version(scope))
+
+
+def bump_catalog_version():
+    bump_version(CATALOG_SCOPE)
+
+
+def gamer_scope(name, gamer_id):
+    return f'{name}:{gamer_id}'
+
+
+# ================================== ЛОКАЛЬНЫЙ LRU-КЭШ ==================================
+class LocalLRUCache:
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        size = len(entry[1])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[1])
+            self._entries[key] = entry
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Параллельные вызовы с одинаковым ключом ждут результата первого вызова."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+local_cache = LocalLRUCache(LOCAL_CACHE_MAX_ENTRIES, LOCAL_CACHE_MAX_BYTES)
+single_flight = SingleFlight()
+
+
+# ================================== КЭШ ОТВЕТОВ КАТАЛОГА ==================================
+def _response_cache_key(scope, request, view_name, args, kwargs):
+    request_data = request.data if request.data else {}
+    raw = json.dumps([view_name, request.get_full_path(), args, kwargs, request_data],
+                     sort_keys=True, default=str)
+    return f'response:{scope}:{get_version(scope)}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+
+def _build_entry(key, view, request, args, kwargs):
+    """Возвращает (запись, откуда она взята): 'shared' - общий кэш, 'built' - собрана представлением."""
+    entry = cache.get(key)
+    if entry is not None:
+        return entry, 'shared'
+    # Между процессами повторную сборку ограничивает блокировка в общем кэше:
+    # остальные процессы недолго ждут, пока владелец блокировки положит ответ
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, 1, timeout=BUILD_LOCK_TIMEOUT)
+    if not locked:
+        deadline = time.monotonic() + BUILD_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(BUILD_WAIT_STEP)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry, 'shared'
+    try:
+        response = view(request, *args, **kwargs)
+        content = JSONRenderer().render(response.data) if hasattr(response, 'data') else response.content
+        entry = (response.status_code, content)
+        if response.status_code < 500:
+            cache.set(key, entry, timeout=SHARED_CACHE_TIMEOUT)
+        return entry, 'built'
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+def cached_response(scope=CATALOG_SCOPE):
+    """
+    Кэширует JSON-ответ представления с ключом по версии данных scope.
+    Изменение данных увеличивает версию (bump_version), и старые записи
+    больше не читаются, а вытесняются из кэшей по LRU и таймауту.
+    Каждый ответ пишет в лог, откуда он взят (local/shared/built), чтобы по логам считать долю попаданий.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = _response_cache_key(scope, request, view.__name__, args, kwargs)
+            entry = local_cache.get(key)
+            source = 'local'
+            if entry is None:
+                entry, source = single_flight.do(key, lambda: _build_entry(key, view, request, args, kwargs))
+                if entry[0] < 500:
+                    local_cache.set(key, entry)
+            logger.info(f'Кэш ответов {scope}: {view.__name__} - {source}')
+            status_code, content = entry
+            return HttpResponse(content, status=status_code, content_type='application/json')
+        return wrapper
+    return decorator
@@ -0,0 +1,104 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from egames.models import DiscountCampaign, Game, GamePriceWindow, GenreGame
+from egames.price_drops import record_price_changes
+
+APPLY_BATCH_SIZE = 500
+
+
+def campaign_game_ids(campaign):
+    game_ids = set(campaign.games.values_list('id', flat=True))
+    game_ids.update(GenreGame.objects.filter(genre__in=campaign.genres.all()).values_list('game_id', flat=True))
+    return game_ids
+
+
+def _campaigns_by_game(game_ids, now):
+    active = DiscountCampaign.objects.filter(is_deleted=False, ends_at__gt=now)
+    campaigns = active.in_bulk()
+    links = defaultdict(set)
+    for game_id, campaign_id in (DiscountCampaign.games.through.objects
+                                 .filter(game_id__in=game_ids, discountcampaign__in=active)
+                                 .values_list('game_id', 'discountcampaign_id')):
+        links[game_id].add(campaign_id)
+    for game_id, campaign_id in (GenreGame.objects
+                                 .filter(game_id__in=game_ids, genre__discountcampaign__in=active)
+                                 .values_list('game_id', 'genre__discountcampaign')):
+        links[game_id].add(campaign_id)
+    return {game_id: [campaigns[campaign_id] for campaign_id in campaign_ids]
+            for game_id, campaign_ids in links.items()}
+
+
+def _timeline(price, campaigns, now):
+    # Отрезки между соседними границами кампаний; при пересечении действует наибольшая скидка
+    boundaries = sorted({max(c.starts_at, now) for c in campaigns} | {c.ends_at for c in campaigns})
+    windows = []
+    for starts_at, ends_at in zip(boundaries, boundaries[1:]):
+        discounts = [c.discount_percent for c in campaigns if c.starts_at <= starts_at and c.ends_at >= ends_at]
+        if not discounts:
+            continue
+        discount = max(discounts)
+        if windows and windows[-1][1] == starts_at and windows[-1][2] == discount:
+            windows[-1][1] = ends_at
+        else:
+            windows.append([starts_at, ends_at, discount])
+    return [(starts_at, ends_at, discount, Game.compute_final_price(price, discount))
+            for starts_at, ends_at, discount in windows]
+
+
+def rebuild_price_timeline(game_ids):
+    """Заново рассчитывает предстоящие окна цен для указанных игр по действующим кампаниям."""
+    game_ids = list(game_ids)
+    now = timezone.now()
+    campaigns = _campaigns_by_game(game_ids, now)
+    prices = dict(Game.objects.filter(id__in=campaigns).values_list('id', 'price'))
+    windows = [GamePriceWindow(game_id=game_id, starts_at=starts_at, ends_at=ends_at,
+                               discount_percent=discount, final_price=final_price)
+               for game_id, game_campaigns in campaigns.items()
+               for starts_at, ends_at, discount, final_price in _timeline(prices[game_id], game_campaigns, now)]
+    with transaction.atomic():
+        GamePriceWindow.objects.filter(game_id__in=game_ids).delete()
+        GamePriceWindow.objects.bulk_create(windows, batch_size=APPLY_BATCH_SIZE)
+
+
+def _update_in_batches(game_ids, **fields):
+    for start in range(0, len(game_ids), APPLY_BATCH_SIZE):
+        Game.objects.filter(id__in=game_ids[start:start + APPLY_BATCH_SIZE]).update(**fields)
+
+
+def apply_campaign_prices(now=None):
+    """
+    Переносит в Game цены окон, границы которых уже наступили.
+    Игры с одинаковыми новыми значениями обновляются одним UPDATE на пачку.
+    Возвращает список id игр, цена которых изменилась.
+    """
+    now = now or timezone.now()
+    active_windows = GamePriceWindow.objects.filter(starts_at__lte=now, ends_at__gt=now)
+    with transaction.atomic():
+        price_changes = []
+        started = defaultdict(list)
+        for game_id, discount, final_price, old_final_price in (
+                active_windows.exclude(game__campaign_discount=F('discount_percent'))
+                .values_list('game_id', 'discount_percent', 'final_price', 'game__final_price')):
+            started[(discount, final_price)].append(game_id)
+            price_changes.append((game_id, old_final_price, final_price))
+        ended = defaultdict(list)
+        for game_id, price, discount, old_final_price in (Game.objects
+                                                          .filter(campaign_discount__isnull=False)
+                                                          .filter(~Exists(active_windows.filter(game=OuterRef('pk'))))
+                                                          .values_list('id', 'price', 'discount_percent',
+                                                                       'final_price')):
+            final_price = Game.compute_final_price(price, discount)
+            ended[final_price].append(game_id)
+            price_changes.append((game_id, old_final_price, final_price))
+        for (discount, final_price), game_ids in started.items():
+            _update_in_batches(game_ids, campaign_discount=discount, final_price=final_price)
+        for final_price, game_ids in ended.items():
+            _update_in_batches(game_ids, campaign_discount=None, final_price=final_price)
+        GamePriceWindow.objects.filter(ends_at__lte=now).delete()
+        record_price_changes(price_changes)
+    return ([game_id for game_ids in started.values() for game_id in game_ids] +
+            [game_id for game_ids in ended.values() for game_id in game_ids])
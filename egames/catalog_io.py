@@ -0,0 +1,164 @@
+import csv
+import io
+import json
+import math
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+
+from egames.api.cards import refresh_game_cards
+from egames.cache import bump_catalog_version
+from egames.models import Game
+from egames.search import index_games
+
+FORMATS = ('ndjson', 'csv')
+EXPORT_FIELDS = ('id', 'title', 'price', 'discount_percent', 'final_price', 'description', 'is_deleted')
+IMPORT_CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BUFFER_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 100
+IMPORT_CHUNK_ATTEMPTS = 3
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def detect_format(filename, default='ndjson'):
+    extension = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    if extension == 'csv':
+        return 'csv'
+    return default
+
+
+def iter_text_lines(binary_lines):
+    # Байты не в UTF-8 заменяются символом U+FFFD, а строка с ним отклоняется в _parse_record:
+    # так ошибка кодировки считается ошибкой одной строки и не прерывает импорт
+    for line in binary_lines:
+        yield line.decode('utf-8-sig', errors='replace') if isinstance(line, bytes) else line
+
+
+def iter_records(lines, file_format):
+    """Возвращает пары (номер строки, запись) без чтения всего файла в память."""
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, None
+            continue
+        yield line_number, record
+
+
+def _parse_record(record):
+    if not isinstance(record, dict):
+        raise ImportRowError('Строка не является JSON-объектом')
+    if any(isinstance(value, str) and '\ufffd' in value for value in record.values()):
+        raise ImportRowError('Строка содержит символы не в кодировке UTF-8')
+    title = record.get('title') or ''
+    description = record.get('description') or ''
+    if not isinstance(title, str) or not isinstance(description, str):
+        raise ImportRowError('Поля title и description должны быть строками')
+    title = title.strip()
+    if not title or len(title) > Game._meta.get_field('title').max_length:
+        raise ImportRowError('Поле title пустое или слишком длинное')
+    if len(description) > Game._meta.get_field('description').max_length:
+        raise ImportRowError('Поле description слишком длинное')
+    try:
+        price = float(record.get('price'))
+        discount_percent = float(record.get('discount_percent') or 0)
+    except (TypeError, ValueError):
+        raise ImportRowError('Поля price и discount_percent должны содержать только числа')
+    if not math.isfinite(price) or not math.isfinite(discount_percent):
+        raise ImportRowError('Поля price и discount_percent должны быть конечными числами')
+    if price < 0 or not 0 <= discount_percent <= 100:
+        raise ImportRowError('Цена не может быть отрицательной, а скидка должна быть от 0 до 100')
+    return Game(title=title, price=price, discount_percent=discount_percent, description=description,
+                final_price=Game.compute_final_price(price, discount_percent))
+
+
+def _existing_titles(titles):
+    return set(Game.objects.filter(title__in=titles).values_list('title', flat=True))
+
+
+def _insert_new_games(games):
+    """
+    Вставляет пачку игр, пропуская названия, которые уже есть в каталоге.
+    Уже имеющиеся названия ищутся одним запросом на пачку; если параллельный импорт
+    или создание игры заняли название между этим запросом и вставкой, уникальное
+    ограничение откатывает вставку, и пачка разбирается заново.
+    Возвращает (созданные игры, число дубликатов).
+    """
+    for attempt in range(IMPORT_CHUNK_ATTEMPTS):
+        existing = _existing_titles([game.title for game in games])
+        new_games = []
+        for game in games:
+            if game.title not in existing:
+                existing.add(game.title)
+                new_games.append(game)
+        try:
+            with transaction.atomic():
+                return Game.objects.bulk_create(new_games), len(games) - len(new_games)
+        except IntegrityError:
+            if attempt == IMPORT_CHUNK_ATTEMPTS - 1:
+                raise
+            for game in new_games:
+                game.pk = None
+
+
+def _import_chunk(rows, report):
+    games = []
+    for line_number, record in rows:
+        try:
+            games.append(_parse_record(record))
+        except ImportRowError as e:
+            report['errors'] += 1
+            if len(report['error_details']) < MAX_REPORTED_ERRORS:
+                report['error_details'].append({'line': line_number, 'error': str(e)})
+    created, duplicates = _insert_new_games(games)
+    report['duplicates'] += duplicates
+    game_ids = [game.id for game in created]
+    index_games(game_ids)
+    refresh_game_cards(game_ids)
+    report['created'] += len(created)
+
+
+def import_games(records, chunk_size=IMPORT_CHUNK_SIZE):
+    report = {'created': 0, 'duplicates': 0, 'errors': 0, 'error_details': []}
+    records = iter(records)
+    while True:
+        rows = list(islice(records, chunk_size))
+        if not rows:
+            break
+        _import_chunk(rows, report)
+    if report['created']:
+        bump_catalog_version()
+    return report
+
+
+def export_games(file_format):
+    """Генератор выгрузки каталога: строки читаются из базы пачками и отдаются блоками по ~64 КБ."""
+    games = Game.objects.order_by('id').values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    buffer = io.StringIO()
+    if file_format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        write_row = writer.writerow
+    else:
+        def write_row(row):
+            buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + '\n')
+    for row in games:
+        write_row(row)
+        if buffer.tell() >= EXPORT_BUFFER_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,102 @@
+from array import array
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+
+from egames.models import Friend, Gamer
+
+FRIENDS_CACHE_TIMEOUT = 60 * 60
+SUGGESTIONS_LIMIT = 10
+MAX_SUGGESTIONS_LIMIT = 50
+# Сколько списков друзей просматривается при поиске друзей друзей
+MAX_SUGGESTION_FANOUT = 200
+
+
+def _key(gamer_id):
+    return f'friends:{gamer_id}'
+
+
+def _from_bytes(raw):
+    friend_ids = array('I')
+    friend_ids.frombytes(raw)
+    return friend_ids
+
+
+def get_friend_ids_many(gamer_ids):
+    """
+    Списки смежности графа друзей: {id геймера: отсортированный массив id его друзей}.
+    В кэше каждый список хранится упакованным массивом 32-битных чисел; промахи кэша
+    загружаются одним запросом на все недостающие списки.
+    """
+    keys = {_key(gamer_id): gamer_id for gamer_id in gamer_ids}
+    adjacency = {keys[key]: _from_bytes(raw) for key, raw in cache.get_many(list(keys)).items()}
+    missing = [gamer_id for gamer_id in keys.values() if gamer_id not in adjacency]
+    if missing:
+        loaded = {gamer_id: array('I') for gamer_id in missing}
+        for gamer_id, friend_id in (Friend.objects.filter(gamer_id__in=missing).order_by('gamer_id', 'friend_id')
+                                    .values_list('gamer_id', 'friend_id')):
+            loaded[gamer_id].append(friend_id)
+        cache.set_many({_key(gamer_id): friend_ids.tobytes() for gamer_id, friend_ids in loaded.items()},
+                       timeout=FRIENDS_CACHE_TIMEOUT)
+        adjacency.update(loaded)
+    return adjacency
+
+
+def get_friend_ids(gamer_id):
+    return get_friend_ids_many([gamer_id])[gamer_id]
+
+
+def invalidate_friends(gamer_id):
+    transaction.on_commit(lambda: cache.delete(_key(gamer_id)))
+
+
+def _intersect(left, right):
+    # Слияние двух отсортированных массивов за O(len(left) + len(right))
+    common = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        if left[i] == right[j]:
+            common.append(left[i])
+            i += 1
+            j += 1
+        elif left[i] < right[j]:
+            i += 1
+        else:
+            j += 1
+    return common
+
+
+def mutual_friend_ids(gamer_id, other_id):
+    adjacency = get_friend_ids_many([gamer_id, other_id])
+    return _intersect(adjacency[gamer_id], adjacency[other_id])
+
+
+def active_usernames(gamer_ids):
+    return dict(Gamer.objects.filter(id__in=gamer_ids, is_deleted=False).values_list('id', 'username'))
+
+
+def suggest_friends(gamer_id, limit=SUGGESTIONS_LIMIT, fanout=MAX_SUGGESTION_FANOUT):
+    """
+    Друзья друзей, которых еще нет в списке геймера, по убыванию числа общих друзей.
+    Глубина поиска - два шага, просматриваются списки не более fanout друзей.
+    Возвращает список (id, логин, число общих друзей) только для неудаленных геймеров.
+    """
+    friends = get_friend_ids(gamer_id)
+    counts = Counter()
+    for friend_ids in get_friend_ids_many(friends[:fanout]).values():
+        counts.update(friend_ids)
+    excluded = set(friends)
+    excluded.add(gamer_id)
+    ranked = sorted((candidate for candidate in counts if candidate not in excluded),
+                    key=lambda candidate: (-counts[candidate], candidate))
+    suggestions = []
+    # Удаленные геймеры отсеиваются запросом на каждую порцию кандидатов, обычно хватает одной
+    for start in range(0, len(ranked), limit):
+        chunk = ranked[start:start + limit]
+        usernames = active_usernames(chunk)
+        suggestions.extend((candidate, usernames[candidate], counts[candidate])
+                           for candidate in chunk if candidate in usernames)
+        if len(suggestions) >= limit:
+            break
+    return suggestions[:limit]
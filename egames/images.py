@@ -0,0 +1,88 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+COVER_DIR = 'covers'
+THUMBNAIL_SIZES = {
+    'list': (128, 128),
+    'card': (320, 320),
+    'detail': (960, 960),
+}
+THUMBNAIL_QUALITY = 85
+THUMBNAIL_WORKERS = 4
+
+# Pillow отпускает GIL при декодировании и масштабировании, поэтому размеры считаются параллельно
+_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='cover-thumbnails')
+
+
+def _cover_path(cover_hash, suffix):
+    return f'{COVER_DIR}/{cover_hash[:2]}/{cover_hash}{suffix}'
+
+
+def thumbnail_path(cover_hash, size):
+    return _cover_path(cover_hash, f'_{size}.jpg')
+
+
+def cover_urls(cover_hash):
+    if not cover_hash:
+        return None
+    return {size: default_storage.url(thumbnail_path(cover_hash, size)) for size in THUMBNAIL_SIZES}
+
+
+def _save_once(path, content):
+    """Возвращает True, если файл записан этим вызовом."""
+    # Имя файла определяется содержимым: если файл уже есть, он идентичен
+    if default_storage.exists(path):
+        return False
+    default_storage.save(path, ContentFile(content))
+    return True
+
+
+def _make_thumbnail(content, cover_hash, size):
+    image = ImageOps.exif_transpose(Image.open(BytesIO(content)))
+    image.thumbnail(THUMBNAIL_SIZES[size], Image.Resampling.LANCZOS)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=THUMBNAIL_QUALITY, optimize=True, progressive=True)
+    path = thumbnail_path(cover_hash, size)
+    return path if _save_once(path, buffer.getvalue()) else None
+
+
+def store_cover(file):
+    """
+    Сохраняет оригинал обложки под именем по SHA-256 содержимого и строит миниатюры всех размеров.
+    Оригинал записывается после миниатюр; если что-то не удалось, записанные этим вызовом файлы удаляются,
+    а исключение (OSError для нечитаемого изображения) пробрасывается дальше.
+    Возвращает (хэш, путь к оригиналу в хранилище).
+    """
+    content = b''.join(file.chunks()) if hasattr(file, 'chunks') else file.read()
+    cover_hash = hashlib.sha256(content).hexdigest()
+    extension = os.path.splitext(getattr(file, 'name', '') or '')[1].lower() or '.jpg'
+    original_path = _cover_path(cover_hash, extension)
+    futures = [_executor.submit(_make_thumbnail, content, cover_hash, size) for size in THUMBNAIL_SIZES]
+    written = []
+    error = None
+    # Дожидаемся всех миниатюр, даже если одна упала, чтобы удалить уже записанные
+    for future in futures:
+        try:
+            path = future.result()
+        except Exception as e:
+            error = error or e
+            continue
+        if path is not None:
+            written.append(path)
+    try:
+        if error is not None:
+            raise error
+        _save_once(original_path, content)
+    except Exception:
+        for path in written:
+            default_storage.delete(path)
+        raise
+    return cover_hash, original_path
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from egames.api.cards import refresh_game_cards
+from egames.cache import bump_catalog_version
+from egames.campaigns import apply_campaign_prices, rebuild_price_timeline
+from egames.models import Game
+
+
+class Command(BaseCommand):
+    help = ('Применяет цены скидочных кампаний, границы которых уже наступили. '
+            'Предназначена для периодического запуска планировщиком (например, cron раз в минуту)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Предварительно пересчитать окна цен для всех игр')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            rebuild_price_timeline(Game.objects.values_list('id', flat=True))
+        changed = apply_campaign_prices()
+        refresh_game_cards(changed)
+        if changed:
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'Цены обновлены для {len(changed)} игр'))
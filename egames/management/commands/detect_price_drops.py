@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from egames.price_drops import detect_price_drops
+
+
+class Command(BaseCommand):
+    help = ('Находит снижения цен на игры из wishlist и записывает уведомления геймеров. '
+            'Предназначена для периодического запуска планировщиком (например, cron после apply_discount_campaigns)')
+
+    def handle(self, *args, **options):
+        games, notified = detect_price_drops()
+        self.stdout.write(self.style.SUCCESS(f'Изменений цен разобрано: {games}, уведомлений записано: {notified}'))
@@ -0,0 +1,22 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from egames.catalog_io import FORMATS, export_games
+
+
+class Command(BaseCommand):
+    help = 'Выгружает каталог игр в формате NDJSON или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file-format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--output', help='Файл для выгрузки (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for block in export_games(options['file_format']):
+                output.write(block)
+        finally:
+            if output is not sys.stdout:
+                output.close()
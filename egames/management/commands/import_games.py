@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from egames.catalog_io import FORMATS, detect_format, import_games, iter_records
+
+
+class Command(BaseCommand):
+    help = 'Импортирует каталог игр из файла NDJSON или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу каталога')
+        parser.add_argument('--file-format', choices=FORMATS, help='Формат файла (по умолчанию по расширению)')
+
+    def handle(self, *args, **options):
+        file_format = options['file_format'] or detect_format(options['path'])
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as catalog:
+                report = import_games(iter_records(catalog, file_format))
+        except OSError as e:
+            raise CommandError(f'Не удалось прочитать файл: {e}')
+        for error in report['error_details']:
+            self.stderr.write(f'Строка {error["line"]}: {error["error"]}')
+        self.stdout.write(self.style.SUCCESS(f'Создано игр: {report["created"]}, '
+                                             f'дубликатов: {report["duplicates"]}, ошибок: {report["errors"]}'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from egames.api.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = ('Удаляет просроченные ключи идемпотентности. '
+            'Предназначена для периодического запуска планировщиком (например, cron раз в час)')
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(f'Удалено ключей: {deleted}'))
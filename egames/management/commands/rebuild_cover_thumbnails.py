@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from egames.api.cards import refresh_game_cards
+from egames.cache import bump_catalog_version
+from egames.images import store_cover
+from egames.models import Game
+
+
+class Command(BaseCommand):
+    help = 'Переносит обложки игр в хранилище по хэшу содержимого и строит для них миниатюры'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Обработать все обложки, а не только еще не обработанные')
+
+    def handle(self, *args, **options):
+        games = Game.objects.exclude(cover_image='').exclude(cover_image__isnull=True)
+        if not options['all']:
+            games = games.filter(cover_hash='')
+        processed = []
+        for game in games.only('id', 'cover_image', 'cover_hash'):
+            try:
+                with game.cover_image.open('rb') as cover:
+                    game.cover_hash, game.cover_image.name = store_cover(cover)
+            except (OSError, ValueError) as e:
+                self.stderr.write(f'Игра {game.id}: не удалось обработать обложку ({e})')
+                continue
+            Game.objects.filter(id=game.id).update(cover_hash=game.cover_hash, cover_image=game.cover_image.name)
+            processed.append(game.id)
+        refresh_game_cards(processed)
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'Обработано обложек: {len(processed)}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from egames.api.cards import refresh_game_cards
+from egames.models import Game
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает сохраненные JSON-карточки всех игр'
+
+    def handle(self, *args, **options):
+        game_ids = list(Game.objects.order_by('id').values_list('id', flat=True))
+        refresh_game_cards(game_ids)
+        self.stdout.write(self.style.SUCCESS(f'Карточки перестроены для {len(game_ids)} игр'))
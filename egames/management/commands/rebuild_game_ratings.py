@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from egames.api.cards import refresh_game_cards
+from egames.cache import bump_catalog_version
+from egames.models import Game, Review
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает количество отзывов, сумму и среднюю оценку для всех игр'
+
+    def handle(self, *args, **options):
+        stats = {row['game']: row for row in (Review.objects.filter(is_deleted=False)
+                                              .values('game').annotate(count=Count('id'), total=Sum('rating')))}
+        games = list(Game.objects.only('id', 'review_count', 'rating_sum', 'rating_avg'))
+        changed = []
+        for game in games:
+            row = stats.get(game.id)
+            old = (game.review_count, game.rating_sum, game.rating_avg)
+            game.review_count = row['count'] if row else 0
+            game.rating_sum = row['total'] if row else 0
+            game.rating_avg = game.rating_sum / game.review_count if game.review_count else 0
+            if (game.review_count, game.rating_sum, game.rating_avg) != old:
+                changed.append(game)
+        with transaction.atomic():
+            Game.objects.bulk_update(changed, ['review_count', 'rating_sum', 'rating_avg'], batch_size=500)
+        # Агрегаты входят в карточки и кэшированные списки каталога, как и после записи отзыва
+        refresh_game_cards([game.id for game in changed])
+        if changed:
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'Агрегаты отзывов пересчитаны для {len(games)} игр, '
+                                             f'изменились у {len(changed)}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from egames.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает полнотекстовый индекс игр (SQLite FTS5)'
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            self.stdout.write(self.style.WARNING('Полнотекстовый индекс поддерживается только для SQLite'))
+            return
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано игр: {indexed}'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from egames.sales import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные итоги продаж по таблице покупок (заполнение истории или исправление расхождений)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', help='Пересчитать итоги начиная с этой даты (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        day_from = None
+        if options['date_from']:
+            day_from = parse_date(options['date_from'])
+            if day_from is None:
+                raise CommandError(f'Некорректная дата: {options["date_from"]}')
+        created = rebuild_rollups(day_from)
+        self.stdout.write(self.style.SUCCESS(f'Записано дневных итогов: {created}'))
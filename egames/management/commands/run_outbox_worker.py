@@ -0,0 +1,42 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from egames.outbox import DRAIN_BATCH_SIZE, drain, drain_all
+
+
+class Command(BaseCommand):
+    help = ('Обрабатывает очередь событий (outbox): учет продаж, очистка wishlist после покупки и сброс кэшей. '
+            'Без --once работает постоянно, опрашивая очередь с интервалом --interval')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Разобрать очередь один раз и завершиться')
+        parser.add_argument('--batch-size', type=int, default=DRAIN_BATCH_SIZE,
+                            help='Число событий, забираемых из очереди за раз')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Пауза в секундах, когда очередь пуста')
+        parser.add_argument('--workers', type=int, default=1, help='Число потоков-обработчиков')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            processed = drain_all(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Обработано событий: {processed}'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Обработчик очереди запущен, потоков: {options["workers"]}'))
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for _ in range(options['workers']):
+                pool.submit(self.work, options['batch_size'], options['interval'])
+
+    def work(self, batch_size, interval):
+        while True:
+            close_old_connections()
+            try:
+                claimed, _ = drain(batch_size)
+            except Exception as e:
+                # Например, БД временно недоступна: поток не завершается, а повторяет попытку позже
+                self.stderr.write(f'Ошибка при разборе очереди: {e!r}')
+                claimed = 0
+            if not claimed:
+                time.sleep(interval)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from egames.wallet import SNAPSHOT_MIN_TAIL, find_mismatches, from_cents, take_snapshots
+
+
+class Command(BaseCommand):
+    help = ('Делает снимки баланса кошельков по журналу операций. '
+            'Предназначена для периодического запуска планировщиком (например, cron раз в сутки)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-tail', type=int, default=SNAPSHOT_MIN_TAIL,
+                            help='Минимальное число новых записей журнала для снимка')
+        parser.add_argument('--reconcile', action='store_true',
+                            help='Сверить кэшированный баланс геймеров с журналом')
+
+    def handle(self, *args, **options):
+        created = take_snapshots(options['min_tail'])
+        self.stdout.write(self.style.SUCCESS(f'Создано снимков: {created}'))
+        if options['reconcile']:
+            mismatches = find_mismatches()
+            for gamer_id, wallet, ledger in mismatches:
+                self.stdout.write(self.style.WARNING(
+                    f'Геймер {gamer_id}: баланс {from_cents(wallet)}, по журналу {from_cents(ledger)}'))
+            self.stdout.write(self.style.SUCCESS(f'Расхождений: {len(mismatches)}'))
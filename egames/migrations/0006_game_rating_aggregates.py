@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:23
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    Game = apps.get_model('egames', 'Game')
+    Review = apps.get_model('egames', 'Review')
+    stats = (Review.objects.filter(is_deleted=False)
+             .values('game').annotate(count=Count('id'), total=Sum('rating')))
+    for row in stats:
+        Game.objects.filter(id=row['game']).update(review_count=row['count'], rating_sum=row['total'],
+                                                   rating_avg=row['total'] / row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('egames', '0005_alter_staff_role'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='review_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['rating_avg', 'id'], name='game_rating_avg_idx'),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
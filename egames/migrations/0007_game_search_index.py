@@ -0,0 +1,41 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Game = apps.get_model('egames', 'Game')
+    Genre = apps.get_model('egames', 'Genre')
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE egames_game_fts USING fts5("
+        "title, description, genres, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    genres = defaultdict(list)
+    for game_id, title_genre in (Genre.game.through.objects.filter(genre__is_deleted=False)
+                                 .values_list('game_id', 'genre__title_genre')):
+        genres[game_id].append(title_genre)
+    rows = [(game_id, title, description, ' '.join(genres[game_id]))
+            for game_id, title, description in (Game.objects.filter(is_deleted=False)
+                                                .values_list('id', 'title', 'description'))]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany('INSERT INTO egames_game_fts(rowid, title, description, genres) '
+                           'VALUES (%s, %s, %s, %s)', rows)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS egames_game_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('egames', '0006_game_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
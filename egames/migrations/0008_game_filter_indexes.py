@@ -0,0 +1,48 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('egames', '0007_game_search_index'),
+    ]
+
+    operations = [
+        # Таблица egames_genre_game уже создана автоматически для Genre.game,
+        # поэтому явная промежуточная модель добавляется только в состояние миграций
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='GenreGame',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False,
+                                                   verbose_name='ID')),
+                        ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='egames.game')),
+                        ('genre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='egames.genre')),
+                    ],
+                    options={
+                        'db_table': 'egames_genre_game',
+                        'unique_together': {('genre', 'game')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='genre',
+                    name='game',
+                    field=models.ManyToManyField(through='egames.GenreGame', to='egames.game'),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='genregame',
+            index=models.Index(fields=['game', 'genre'], name='genre_game_game_genre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['is_deleted', 'final_price', 'id'], name='game_deleted_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['is_deleted', 'discount_percent', 'id'], name='game_deleted_discount_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('egames', '0008_game_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameCard',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='egames.game')),
+                ('payload', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
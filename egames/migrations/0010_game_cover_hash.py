@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('egames', '0009_gamecard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='cover_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
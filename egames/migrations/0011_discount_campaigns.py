@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('egames', '0010_game_cover_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='campaign_discount',
+            field=models.FloatField(blank=True, default=None, null=True),
+        ),
+        migrations.CreateModel(
+            name='DiscountCampaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=50)),
+                ('discount_percent', models.FloatField()),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField()),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('games', models.ManyToManyField(blank=True, to='egames.game')),
+                ('genres', models.ManyToManyField(blank=True, to='egames.genre')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GamePriceWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField()),
+                ('discount_percent', models.FloatField()),
+                ('final_price', models.FloatField()),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_windows', to='egames.game')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['starts_at', 'ends_at'], name='price_window_period_idx'), models.Index(fields=['game', 'starts_at'], name='price_window_game_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('egames', '0011_discount_campaigns'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['game', 'is_deleted', 'date'], name='review_game_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['game', 'is_deleted', 'rating'], name='review_game_rating_idx'),
+        ),
+    ]
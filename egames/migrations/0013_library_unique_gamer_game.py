@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:38
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_library_entries(apps, schema_editor):
+    Library = apps.get_model('egames', 'Library')
+    keep = Library.objects.values('gamer', 'game').annotate(keep_id=Min('id')).values('keep_id')
+    Library.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('egames', '0012_review_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_library_entries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='library',
+            constraint=models.UniqueConstraint(fields=('gamer', 'game'), name='library_unique_gamer_game'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:40
+
+import django.db.models.deletion
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    Gamer = apps.get_model('egames', 'Gamer')
+    WalletEntry = apps.get_model('egames', 'WalletEntry')
+    entries = (WalletEntry(gamer_id=gamer_id, kind='opening',
+                           amount_cents=int((Decimal(str(wallet)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP)))
+               for gamer_id, wallet in Gamer.objects.exclude(wallet=0).values_list('pk', 'wallet').iterator())
+    WalletEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('egames', '0014_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount_cents', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('opening', 'Начальный баланс'), ('deposit', 'Пополнение'), ('purchase', 'Покупка')], max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('game', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='egames.game')),
+                ('gamer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='wallet_entries', to='egames.gamer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['gamer', 'id'], name='wallet_entry_gamer_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WalletSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_entry_id', models.BigIntegerField()),
+                ('balance_cents', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('gamer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='wallet_snapshots', to='egames.gamer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['gamer', 'last_entry_id'], name='wallet_snapshot_gamer_idx')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('egames', '0015_wallet_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['gamer', 'timestamp'], name='purchase_gamer_time_idx'),
+        ),
+    ]
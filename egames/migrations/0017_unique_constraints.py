@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:45
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Min, Sum
+
+
+def _remove_duplicate_pairs(model, first, second):
+    keep = model.objects.values(first, second).annotate(keep_id=Min('id')).values('keep_id')
+    model.objects.exclude(id__in=keep).delete()
+
+
+def _rename_duplicate_titles(queryset, field, max_length):
+    # Первая по id запись сохраняет название, остальные получают суффикс с собственным id
+    duplicated = queryset.values(field).annotate(total=Count('id')).filter(total__gt=1).values_list(field, flat=True)
+    for title in list(duplicated):
+        rows = queryset.filter(**{field: title}).order_by('id')[1:]
+        for row in rows:
+            suffix = f' #{row.id}'
+            setattr(row, field, f'{title[:max_length - len(suffix)]}{suffix}')
+            row.save(update_fields=[field])
+
+
+def _remove_duplicate_reviews(Game, Review):
+    # Из повторных отзывов остается самый новый неудаленный, счетчики игр пересчитываются
+    duplicated = (Review.objects.values('game', 'gamer').annotate(total=Count('id'))
+                  .filter(total__gt=1).values_list('game', 'gamer'))
+    game_ids = set()
+    for game_id, gamer_id in list(duplicated):
+        rows = Review.objects.filter(game_id=game_id, gamer_id=gamer_id).order_by('is_deleted', '-date', '-id')
+        Review.objects.filter(id__in=[row.id for row in rows[1:]]).delete()
+        game_ids.add(game_id)
+    for game_id in game_ids:
+        stats = Review.objects.filter(game_id=game_id, is_deleted=False).aggregate(
+            count=Count('id'), total=Sum('rating'), avg=Avg('rating'))
+        Game.objects.filter(id=game_id).update(review_count=stats['count'], rating_sum=stats['total'] or 0,
+                                               rating_avg=stats['avg'] or 0)
+
+
+def remove_duplicates(apps, schema_editor):
+    Game = apps.get_model('egames', 'Game')
+    Genre = apps.get_model('egames', 'Genre')
+    _remove_duplicate_pairs(apps.get_model('egames', 'Friend'), 'gamer', 'friend')
+    _remove_duplicate_pairs(apps.get_model('egames', 'Wishlist'), 'gamer', 'game')
+    _remove_duplicate_reviews(Game, apps.get_model('egames', 'Review'))
+    _rename_duplicate_titles(Game.objects.all(), 'title', 30)
+    _rename_duplicate_titles(Genre.objects.filter(is_deleted=False), 'title_genre', 50)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('egames', '0016_purchase_history_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='friend',
+            constraint=models.UniqueConstraint(fields=('gamer', 'friend'), name='friend_unique_gamer_friend'),
+        ),
+        migrations.AddConstraint(
+            model_name='game',
+            constraint=models.UniqueConstraint(fields=('title',), name='game_unique_title'),
+        ),
+        migrations.AddConstraint(
+            model_name='genre',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_deleted', False)), fields=('title_genre',), name='genre_unique_active_title'),
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('game', 'gamer'), name='review_unique_game_gamer'),
+        ),
+        migrations.AddConstraint(
+            model_name='wishlist',
+            constraint=models.UniqueConstraint(fields=('gamer', 'game'), name='wishlist_unique_gamer_game'),
+        ),
+    ]
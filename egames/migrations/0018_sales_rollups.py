@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_purchase_prices(apps, schema_editor):
+    # Цена берется из записи журнала кошелька о покупке, а для покупок до журнала - текущая цена игры
+    Game = apps.get_model('egames', 'Game')
+    Purchase = apps.get_model('egames', 'Purchase')
+    WalletEntry = apps.get_model('egames', 'WalletEntry')
+    paid = (WalletEntry.objects.filter(gamer=OuterRef('gamer'), game=OuterRef('game'), kind='purchase')
+            .order_by('-id').annotate(price=-F('amount_cents') / 100.0).values('price')[:1])
+    current = Game.objects.filter(id=OuterRef('game')).values('final_price')[:1]
+    Purchase.objects.update(price=Coalesce(Subquery(paid), Subquery(current)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('egames', '0017_unique_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchase',
+            name='price',
+            field=models.FloatField(default=0),
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('purchases', models.PositiveIntegerField(default=0)),
+                ('revenue_cents', models.BigIntegerField(default=0)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='egames.game')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'game'], name='sales_rollup_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('game', 'day'), name='sales_rollup_unique_game_day')],
+            },
+        ),
+        migrations.RunPython(fill_purchase_prices, migrations.RunPython.noop),
+    ]
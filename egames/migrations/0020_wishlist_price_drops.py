@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('egames', '0019_outbox_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_price', models.FloatField()),
+                ('new_price', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='egames.game')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WishlistPriceDrop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_price', models.FloatField()),
+                ('new_price', models.FloatField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='egames.game')),
+                ('gamer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='egames.gamer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['gamer', 'created_at'], name='price_drop_gamer_time_idx')],
+                'constraints': [models.UniqueConstraint(fields=('gamer', 'game'), name='price_drop_unique_gamer_game')],
+            },
+        ),
+    ]
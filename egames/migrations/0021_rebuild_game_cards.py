@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def drop_game_cards(apps, schema_editor):
+    # В сохраненных карточках последние отзывы лежат под ключом latest_reviews;
+    # недостающие карточки строятся заново при первом чтении
+    apps.get_model('egames', 'GameCard').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('egames', '0020_wishlist_price_drops'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_game_cards, migrations.RunPython.noop),
+    ]
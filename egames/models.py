@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User, AbstractUser
-from django.db.models import CASCADE
+from django.db.models import CASCADE, Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
 from django.utils import timezone
 
 
@@ -10,16 +11,59 @@ class Game(models.Model):
 
     title = models.CharField(max_length=30)
     cover_image = models.ImageField(default=None, blank=True)
+    cover_hash = models.CharField(max_length=64, blank=True, default='')
     price = models.FloatField(null=False)
     discount_percent = models.FloatField(default=0)
     final_price = models.FloatField(default=0)
+    campaign_discount = models.FloatField(default=None, null=True, blank=True)
     description = models.TextField(max_length=200)
     is_deleted = models.BooleanField(default=False)
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_avg = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['rating_avg', 'id'], name='game_rating_avg_idx'),
+            models.Index(fields=['is_deleted', 'final_price', 'id'], name='game_deleted_price_idx'),
+            models.Index(fields=['is_deleted', 'discount_percent', 'id'], name='game_deleted_discount_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['title'], name='game_unique_title'),
+        ]
+
+    @staticmethod
+    def compute_final_price(price, discount_percent):
+        return price - (price * discount_percent // 100)
+
+    @property
+    def effective_discount(self):
+        return self.discount_percent if self.campaign_discount is None else self.campaign_discount
 
     def save(self, *args, **kwargs):
-        self.final_price = self.price - (self.price * self.discount_percent // 100)
+        self.final_price = self.compute_final_price(self.price, self.effective_discount)
         super(Game, self).save(*args, **kwargs)
 
+    @classmethod
+    def apply_review_change(cls, game_id, count_delta, rating_delta):
+        # Один UPDATE: правые части SET видят значения до изменения строки
+        new_count = F('review_count') + count_delta
+        new_sum = F('rating_sum') + rating_delta
+        cls.objects.filter(id=game_id).update(
+            review_count=new_count,
+            rating_sum=new_sum,
+            rating_avg=Case(
+                When(review_count=-count_delta, then=Value(0.0)),
+                default=Cast(new_sum, FloatField()) / new_count,
+            ),
+        )
+
+
+class GameCard(models.Model):
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, primary_key=True, related_name='card')
+    payload = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
 
 class Genre(models.Model):
     def __str__(self):
@@ -27,9 +71,55 @@ class Genre(models.Model):
 
     title_genre = models.CharField(max_length=50)
     description = models.TextField(max_length=200)
-    game = models.ManyToManyField(Game)
+    game = models.ManyToManyField(Game, through='GenreGame')
     is_deleted = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            # Название удаленного жанра можно занять заново, поэтому уникальны только действующие
+            models.UniqueConstraint(fields=['title_genre'], condition=Q(is_deleted=False),
+                                    name='genre_unique_active_title'),
+        ]
+
+
+class GenreGame(models.Model):
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE)
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'egames_genre_game'
+        unique_together = [('genre', 'game')]
+        indexes = [
+            models.Index(fields=['game', 'genre'], name='genre_game_game_genre_idx'),
+        ]
+
+
+class DiscountCampaign(models.Model):
+    def __str__(self):
+        return self.title
+
+    title = models.CharField(max_length=50)
+    discount_percent = models.FloatField()
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    games = models.ManyToManyField(Game, blank=True)
+    genres = models.ManyToManyField(Genre, blank=True)
+    is_deleted = models.BooleanField(default=False)
+
+
+class GamePriceWindow(models.Model):
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='price_windows')
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    discount_percent = models.FloatField()
+    final_price = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['starts_at', 'ends_at'], name='price_window_period_idx'),
+            models.Index(fields=['game', 'starts_at'], name='price_window_game_idx'),
+        ]
+
 
 class Gamer(User):
     def __str__(self):
@@ -39,6 +129,16 @@ class Gamer(User):
     wallet = models.FloatField(default=0)
     is_deleted = models.BooleanField(default=False)
 
+    def save(self, *args, **kwargs):
+        # Начальный баланс попадает в журнал кошелька, каким бы путем ни был создан геймер
+        from egames.wallet import to_cents  # egames.wallet импортирует модели
+
+        adding = self._state.adding
+        with transaction.atomic():
+            super(Gamer, self).save(*args, **kwargs)
+            if adding and self.wallet:
+                WalletEntry.objects.create(gamer=self, amount_cents=to_cents(self.wallet), kind=WalletEntry.OPENING)
+
 
 class Purchase(models.Model):
     def __str__(self):
@@ -46,14 +146,41 @@ class Purchase(models.Model):
 
     gamer = models.ForeignKey(Gamer, on_delete=models.CASCADE)
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    price = models.FloatField(default=0)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['gamer', 'timestamp'], name='purchase_gamer_time_idx'),
+        ]
+
+
+class SalesRollup(models.Model):
+    # Продажи игры за день; пополняется при покупке, отчеты читают только эту таблицу
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    day = models.DateField()
+    purchases = models.PositiveIntegerField(default=0)
+    revenue_cents = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'day'], name='sales_rollup_unique_game_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'game'], name='sales_rollup_day_idx'),
+        ]
+
 
 class Library(models.Model):
     gamer = models.ForeignKey(Gamer, on_delete=models.CASCADE, default=timezone.now)
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
     added_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['gamer', 'game'], name='library_unique_gamer_game'),
+        ]
+
 
 class Review(models.Model):
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
@@ -63,16 +190,35 @@ class Review(models.Model):
     date = models.DateTimeField(auto_now_add=True)
     is_deleted = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['game', 'is_deleted', 'date'], name='review_game_date_idx'),
+            models.Index(fields=['game', 'is_deleted', 'rating'], name='review_game_rating_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'gamer'], name='review_unique_game_gamer'),
+        ]
+
 
 class Friend(models.Model):
     gamer = models.ForeignKey(Gamer, related_name='friends', on_delete=models.CASCADE)
     friend = models.ForeignKey(Gamer, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['gamer', 'friend'], name='friend_unique_gamer_friend'),
+        ]
+
 
 class Wishlist(models.Model):
     gamer = models.ForeignKey(Gamer, on_delete=models.CASCADE)
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['gamer', 'game'], name='wishlist_unique_gamer_game'),
+        ]
+
 
 class Role(models.Model):
     def __str__(self):
@@ -88,3 +234,91 @@ class Staff(User):
 
     role = models.ForeignKey(Role, on_delete=CASCADE, null=True)
     is_deleted = models.BooleanField(default=False)
+
+
+class IdempotencyKey(models.Model):
+    # Ключ хранится как sha256 от (пользователь, эндпоинт, Idempotency-Key), поэтому строка компактна
+    key_hash = models.CharField(max_length=64, primary_key=True)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.BinaryField(null=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
+
+
+class WalletEntry(models.Model):
+    OPENING = 'opening'
+    DEPOSIT = 'deposit'
+    PURCHASE = 'purchase'
+    KINDS = [
+        (OPENING, 'Начальный баланс'),
+        (DEPOSIT, 'Пополнение'),
+        (PURCHASE, 'Покупка'),
+    ]
+
+    gamer = models.ForeignKey(Gamer, on_delete=models.CASCADE, related_name='wallet_entries')
+    amount_cents = models.BigIntegerField()
+    kind = models.CharField(max_length=16, choices=KINDS)
+    game = models.ForeignKey(Game, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['gamer', 'id'], name='wallet_entry_gamer_idx'),
+        ]
+
+
+class WalletSnapshot(models.Model):
+    gamer = models.ForeignKey(Gamer, on_delete=models.CASCADE, related_name='wallet_snapshots')
+    last_entry_id = models.BigIntegerField()
+    balance_cents = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['gamer', 'last_entry_id'], name='wallet_snapshot_gamer_idx'),
+        ]
+
+
+class OutboxEvent(models.Model):
+    # Событие пишется в транзакции основной операции, побочные эффекты выполняет фоновый обработчик
+    kind = models.CharField(max_length=32)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claim = models.UUIDField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='outbox_available_idx'),
+        ]
+
+
+class PriceChange(models.Model):
+    # Журнал изменений итоговой цены; разбирается пакетной задачей поиска снижений цен в wishlist
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    old_price = models.FloatField()
+    new_price = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class WishlistPriceDrop(models.Model):
+    gamer = models.ForeignKey(Gamer, on_delete=models.CASCADE)
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    old_price = models.FloatField()
+    new_price = models.FloatField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['gamer', 'game'], name='price_drop_unique_gamer_game'),
+        ]
+        indexes = [
+            models.Index(fields=['gamer', 'created_at'], name='price_drop_gamer_time_idx'),
+        ]
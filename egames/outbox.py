@@ -0,0 +1,137 @@
+import logging
+import uuid
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from egames.cache import bump_version, gamer_scope
+from egames.models import OutboxEvent, Wishlist, WishlistPriceDrop
+from egames.ownership import WISHLIST, invalidate
+from egames.sales import record_sales
+
+logger = logging.getLogger(__name__)
+
+PURCHASE_COMPLETED = 'purchase_completed'
+
+DRAIN_BATCH_SIZE = 100
+MAX_ATTEMPTS = 10
+# Событие, обработчик которого не завершился за время аренды (упал процесс), снова становится доступным
+CLAIM_LEASE = timedelta(minutes=5)
+RETRY_BASE_DELAY = timedelta(seconds=5)
+RETRY_MAX_DELAY = timedelta(hours=1)
+
+
+class LeaseLost(Exception):
+    pass
+
+
+# ================================== ЗАПИСЬ СОБЫТИЙ ==================================
+def enqueue_purchase(gamer_id, sales):
+    """Вызывается в транзакции покупки: sales - список пар (id игры, цена)."""
+    OutboxEvent.objects.create(kind=PURCHASE_COMPLETED, payload={
+        'gamer_id': gamer_id,
+        'day': timezone.localdate().isoformat(),
+        'sales': [[game_id, price] for game_id, price in sales],
+    })
+
+
+# ================================== ОБРАБОТЧИКИ ==================================
+def handle_purchases(payloads):
+    # Продажи учитываются днем покупки, а не днем обработки события
+    sales_by_day = defaultdict(list)
+    bought = Q()
+    gamer_ids = set()
+    for payload in payloads:
+        sales_by_day[payload['day']].extend((game_id, price) for game_id, price in payload['sales'])
+        bought |= Q(gamer_id=payload['gamer_id'], game_id__in=[game_id for game_id, _ in payload['sales']])
+        gamer_ids.add(payload['gamer_id'])
+    for day, sales in sales_by_day.items():
+        record_sales(sales, date.fromisoformat(day))
+    removed = defaultdict(int)
+    for gamer_id in Wishlist.objects.filter(bought).values_list('gamer_id', flat=True):
+        removed[gamer_id] += 1
+    if removed:
+        Wishlist.objects.filter(bought).delete()
+        WishlistPriceDrop.objects.filter(bought).delete()
+    for gamer_id in removed:
+        invalidate(WISHLIST, gamer_id)
+        bump_version(gamer_scope('wishlist', gamer_id))
+
+
+HANDLERS = {
+    PURCHASE_COMPLETED: handle_purchases,
+}
+
+
+# ================================== ОБРАБОТКА ОЧЕРЕДИ ==================================
+def _retry_delay(attempts):
+    # Показатель ограничен, чтобы timedelta не переполнялась при большом MAX_ATTEMPTS
+    return min(RETRY_BASE_DELAY * 2 ** min(attempts - 1, 16), RETRY_MAX_DELAY)
+
+
+def _claim_batch(batch_size, now):
+    token = uuid.uuid4()
+    pending = (OutboxEvent.objects.filter(available_at__lte=now, attempts__lt=MAX_ATTEMPTS)
+               .order_by('available_at', 'id').values_list('id', flat=True)[:batch_size])
+    # Условие available_at повторяется в UPDATE: событие, которое успел занять другой обработчик, не перезаписывается
+    OutboxEvent.objects.filter(id__in=list(pending), available_at__lte=now).update(
+        claim=token, available_at=now + CLAIM_LEASE, attempts=F('attempts') + 1)
+    return token, list(OutboxEvent.objects.filter(claim=token).order_by('id'))
+
+
+def _process(kind, events, token):
+    # Изменения в БД и удаление событий фиксируются одной транзакцией,
+    # поэтому повторная обработка после сбоя не учитывает покупку дважды
+    with transaction.atomic():
+        HANDLERS[kind]([event.payload for event in events])
+        deleted, _ = OutboxEvent.objects.filter(id__in=[event.id for event in events], claim=token).delete()
+        if deleted != len(events):
+            raise LeaseLost(kind)
+
+
+def _process_or_postpone(kind, events, token, now):
+    try:
+        if kind not in HANDLERS:
+            raise KeyError(f'Неизвестный вид события: {kind}')
+        _process(kind, events, token)
+        return len(events)
+    except LeaseLost:
+        logger.warning(f'Аренда событий {kind} истекла до завершения обработки')
+        return 0
+    except Exception as e:
+        if len(events) > 1:
+            # Ошибочное событие не должно задерживать остальные: пачка разбирается по одному
+            return sum(_process_or_postpone(kind, [event], token, now) for event in events)
+        logger.exception(f'Ошибка обработки события {kind} с ID: {events[0].id}')
+        (OutboxEvent.objects.filter(id=events[0].id, claim=token)
+         .update(available_at=now + _retry_delay(events[0].attempts), last_error=repr(e)))
+        return 0
+
+
+def drain(batch_size=DRAIN_BATCH_SIZE):
+    """
+    Обрабатывает одну пачку готовых событий, события одного вида - одним вызовом обработчика.
+    Событие с ошибкой откладывается с экспоненциальной задержкой; после MAX_ATTEMPTS
+    попыток оно остается в таблице с текстом ошибки для разбора.
+    Возвращает (число взятых событий, число обработанных).
+    """
+    now = timezone.now()
+    token, events = _claim_batch(batch_size, now)
+    by_kind = defaultdict(list)
+    for event in events:
+        by_kind[event.kind].append(event)
+    processed = sum(_process_or_postpone(kind, kind_events, token, now) for kind, kind_events in by_kind.items())
+    return len(events), processed
+
+
+def drain_all(batch_size=DRAIN_BATCH_SIZE):
+    """Разбирает очередь, пока в ней есть готовые события. Возвращает число обработанных."""
+    total = 0
+    while True:
+        claimed, processed = drain(batch_size)
+        total += processed
+        if not claimed:
+            return total
@@ -0,0 +1,73 @@
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import transaction
+
+from egames.models import Library, Wishlist
+
+LIBRARY = 'library'
+WISHLIST = 'wishlist'
+SOURCES = {LIBRARY: Library, WISHLIST: Wishlist}
+OWNERSHIP_CACHE_TIMEOUT = 60 * 60
+MAX_OWNERSHIP_BATCH = 500
+
+
+def _key(kind, gamer_id):
+    return f'ownership:{kind}:{gamer_id}'
+
+
+def _from_bytes(raw):
+    game_ids = array('I')
+    game_ids.frombytes(raw)
+    return game_ids
+
+
+def get_game_ids(kind, gamer_id):
+    """
+    Отсортированный массив id игр из библиотеки (LIBRARY) или wishlist (WISHLIST) геймера.
+    В кэше хранится как упакованный массив 32-битных чисел: 4 байта на игру.
+    """
+    raw = cache.get(_key(kind, gamer_id))
+    if raw is not None:
+        return _from_bytes(raw)
+    game_ids = array('I', SOURCES[kind].objects.filter(gamer_id=gamer_id).order_by('game_id')
+                     .values_list('game_id', flat=True).distinct())
+    cache.set(_key(kind, gamer_id), game_ids.tobytes(), timeout=OWNERSHIP_CACHE_TIMEOUT)
+    return game_ids
+
+
+def _contains(game_ids, game_id):
+    i = bisect_left(game_ids, game_id)
+    return i < len(game_ids) and game_ids[i] == game_id
+
+
+def has_game(kind, gamer_id, game_id):
+    return _contains(get_game_ids(kind, gamer_id), game_id)
+
+
+def filter_game_ids(kind, gamer_id, game_ids):
+    """Оставляет из game_ids только те игры, которые есть в наборе геймера."""
+    owned = get_game_ids(kind, gamer_id)
+    return [game_id for game_id in game_ids if _contains(owned, game_id)]
+
+
+def _add(kind, gamer_id, new_ids):
+    raw = cache.get(_key(kind, gamer_id))
+    if raw is None:
+        return
+    game_ids = array('I', sorted(set(_from_bytes(raw)).union(new_ids)))
+    cache.set(_key(kind, gamer_id), game_ids.tobytes(), timeout=OWNERSHIP_CACHE_TIMEOUT)
+
+
+def add_game_ids(kind, gamer_id, game_ids):
+    """После коммита дописывает игры в закэшированный набор геймера, если он уже загружен."""
+    game_ids = list(game_ids)
+    transaction.on_commit(lambda: _add(kind, gamer_id, game_ids))
+
+
+def invalidate(kind, gamer_id):
+    # Сразу - чтобы повтор внутри той же внешней транзакции (checkout_cart) прочитал набор из БД,
+    # и после коммита - чтобы не осталось набора, закэшированного параллельным запросом до коммита
+    cache.delete(_key(kind, gamer_id))
+    transaction.on_commit(lambda: cache.delete(_key(kind, gamer_id)))
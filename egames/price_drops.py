@@ -0,0 +1,73 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from egames.models import PriceChange, Wishlist, WishlistPriceDrop
+
+PRICE_CHANGE_BATCH_SIZE = 1000
+NOTIFICATION_BATCH_SIZE = 1000
+
+
+def record_price_changes(changes):
+    """changes - тройки (id игры, старая итоговая цена, новая); вызывается в транзакции изменения цены."""
+    PriceChange.objects.bulk_create([PriceChange(game_id=game_id, old_price=old_price, new_price=new_price)
+                                     for game_id, old_price, new_price in changes if old_price != new_price],
+                                    batch_size=PRICE_CHANGE_BATCH_SIZE)
+
+
+def _collapse(changes):
+    # Несколько изменений одной игры сводятся к паре (цена до первого, цена после последнего)
+    prices = {}
+    for game_id, old_price, new_price in changes:
+        first_old = prices[game_id][0] if game_id in prices else old_price
+        prices[game_id] = (first_old, new_price)
+    return prices
+
+
+def _notify_drops(drops, now):
+    created = 0
+    game_ids = list(drops)
+    for start in range(0, len(game_ids), NOTIFICATION_BATCH_SIZE):
+        chunk = game_ids[start:start + NOTIFICATION_BATCH_SIZE]
+        rows = [WishlistPriceDrop(gamer_id=gamer_id, game_id=game_id, old_price=drops[game_id][0],
+                                  new_price=drops[game_id][1], created_at=now)
+                for gamer_id, game_id in Wishlist.objects.filter(game_id__in=chunk).values_list('gamer_id', 'game_id')]
+        # Повторное снижение обновляет уведомление, но сохраняет цену до первого снижения
+        WishlistPriceDrop.objects.bulk_create(rows, batch_size=NOTIFICATION_BATCH_SIZE, update_conflicts=True,
+                                              unique_fields=['gamer', 'game'], update_fields=['new_price', 'created_at'])
+        created += len(rows)
+    return created
+
+
+def _expire_raised(raises):
+    # Уведомление снимается, когда цена снова не ниже цены до снижения
+    by_price = defaultdict(list)
+    for game_id, new_price in raises.items():
+        by_price[new_price].append(game_id)
+    for new_price, game_ids in by_price.items():
+        WishlistPriceDrop.objects.filter(game_id__in=game_ids, old_price__lte=new_price).delete()
+        WishlistPriceDrop.objects.filter(game_id__in=game_ids).update(new_price=new_price)
+
+
+def detect_price_drops():
+    """
+    Разбирает журнал изменений цен пачками: снижения цен соединяются с Wishlist одним запросом
+    на пачку игр, уведомления геймеров записываются bulk-вставкой с обновлением при конфликте.
+    Обработанные записи журнала удаляются в той же транзакции.
+    Возвращает (число измененных игр, число записанных уведомлений).
+    """
+    games = notified = 0
+    while True:
+        with transaction.atomic():
+            changes = list(PriceChange.objects.order_by('id')
+                           .values_list('id', 'game_id', 'old_price', 'new_price')[:PRICE_CHANGE_BATCH_SIZE])
+            if not changes:
+                return games, notified
+            prices = _collapse((game_id, old_price, new_price) for _, game_id, old_price, new_price in changes)
+            drops = {game_id: (old, new) for game_id, (old, new) in prices.items() if new < old}
+            raises = {game_id: new for game_id, (old, new) in prices.items() if new > old}
+            notified += _notify_drops(drops, timezone.now())
+            _expire_raised(raises)
+            PriceChange.objects.filter(id__in=[change_id for change_id, *_ in changes]).delete()
+            games += len(prices)
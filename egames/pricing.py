@@ -0,0 +1,41 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from egames.models import Game
+from egames.price_drops import record_price_changes
+
+REPRICE_BATCH_SIZE = 500
+
+
+def reprice_games(games, discount_percent):
+    """
+    Устанавливает скидку discount_percent всем играм из queryset games.
+    Итоговая цена зависит только от цены и скидки, поэтому она считается
+    через Game.compute_final_price один раз на каждую различную цену,
+    а строки обновляются одним UPDATE на группу игр с одинаковой итоговой ценой.
+    У игр с действующей кампанией итоговая цена не меняется до ее окончания.
+    Возвращает список id игр, у которых изменилась скидка или итоговая цена.
+    """
+    final_prices = {}
+    groups = defaultdict(list)
+    price_changes = []
+    with transaction.atomic():
+        rows = games.select_for_update().values_list('id', 'price', 'discount_percent', 'campaign_discount',
+                                                      'final_price')
+        for game_id, price, old_discount, campaign_discount, old_final_price in rows:
+            if campaign_discount is not None:
+                final_price = old_final_price
+            else:
+                if price not in final_prices:
+                    final_prices[price] = Game.compute_final_price(price, discount_percent)
+                final_price = final_prices[price]
+            if old_discount != discount_percent or old_final_price != final_price:
+                groups[final_price].append(game_id)
+                price_changes.append((game_id, old_final_price, final_price))
+        for final_price, game_ids in groups.items():
+            for start in range(0, len(game_ids), REPRICE_BATCH_SIZE):
+                Game.objects.filter(id__in=game_ids[start:start + REPRICE_BATCH_SIZE]).update(
+                    discount_percent=discount_percent, final_price=final_price)
+        record_price_changes(price_changes)
+    return [game_id for game_ids in groups.values() for game_id in game_ids]
@@ -0,0 +1,114 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from egames.models import Game, Gamer, Library, Purchase, WalletEntry
+from egames.outbox import enqueue_purchase
+from egames.ownership import LIBRARY, add_game_ids, filter_game_ids, has_game, invalidate
+from egames.wallet import record_entries, to_cents
+
+
+class PurchaseError(Exception):
+    pass
+
+
+class GameNotAvailable(PurchaseError):
+    pass
+
+
+class AlreadyOwned(PurchaseError):
+    pass
+
+
+class InsufficientFunds(PurchaseError):
+    pass
+
+
+def buy_game(gamer_id, game_id):
+    """
+    Покупка игры без гонок: строка библиотеки защищена уникальным ограничением (gamer, game),
+    а кошелек списывается условным UPDATE (wallet >= цена) в той же транзакции.
+    Проверки и запись не разделены чтением в Python, поэтому параллельные покупки
+    не могут ни списать деньги дважды, ни потерять обновление баланса.
+    Остальные последствия покупки (итоги продаж, очистка wishlist) выполняет обработчик очереди событий.
+    Возвращает (игра, покупка).
+    """
+    if has_game(LIBRARY, gamer_id, game_id):
+        raise AlreadyOwned(game_id)
+    game = Game.objects.filter(id=game_id, is_deleted=False).only('id', 'title', 'final_price').first()
+    if game is None:
+        raise GameNotAvailable(game_id)
+    try:
+        with transaction.atomic():
+            Library.objects.create(gamer_id=gamer_id, game_id=game_id)
+            debited = (Gamer.objects.filter(pk=gamer_id, wallet__gte=game.final_price)
+                       .update(wallet=F('wallet') - game.final_price))
+            if not debited:
+                raise InsufficientFunds(game_id)
+            purchase = Purchase.objects.create(gamer_id=gamer_id, game_id=game_id, price=game.final_price)
+            record_entries([WalletEntry(gamer_id=gamer_id, game_id=game_id, kind=WalletEntry.PURCHASE,
+                                        amount_cents=-to_cents(game.final_price))])
+            enqueue_purchase(gamer_id, [(game_id, game.final_price)])
+            add_game_ids(LIBRARY, gamer_id, [game_id])
+    except IntegrityError:
+        # Игра уже в библиотеке, а закэшированный набор этого не знал
+        invalidate(LIBRARY, gamer_id)
+        raise AlreadyOwned(game_id)
+    return game, purchase
+
+
+MAX_CART_SIZE = 100
+CHECKOUT_ATTEMPTS = 3
+
+PURCHASED = 'purchased'
+ALREADY_OWNED = 'already_owned'
+NOT_FOUND = 'not_found'
+
+
+def _checkout_once(gamer_id, game_ids):
+    games = {game_id: (title, final_price) for game_id, title, final_price in
+             Game.objects.filter(id__in=game_ids, is_deleted=False).values_list('id', 'title', 'final_price')}
+    owned = set(filter_game_ids(LIBRARY, gamer_id, games))
+    items = []
+    for game_id in game_ids:
+        if game_id not in games:
+            items.append({'game_id': game_id, 'status': NOT_FOUND})
+        elif game_id in owned:
+            items.append({'game_id': game_id, 'status': ALREADY_OWNED})
+        else:
+            title, final_price = games[game_id]
+            items.append({'game_id': game_id, 'status': PURCHASED, 'title': title, 'price': final_price})
+    buying = [item for item in items if item['status'] == PURCHASED]
+    total = sum(item['price'] for item in buying)
+    if not buying:
+        return items, total
+    with transaction.atomic():
+        Library.objects.bulk_create([Library(gamer_id=gamer_id, game_id=item['game_id']) for item in buying])
+        debited = Gamer.objects.filter(pk=gamer_id, wallet__gte=total).update(wallet=F('wallet') - total)
+        if not debited:
+            raise InsufficientFunds(total)
+        Purchase.objects.bulk_create([Purchase(gamer_id=gamer_id, game_id=item['game_id'], price=item['price'])
+                                      for item in buying])
+        record_entries([WalletEntry(gamer_id=gamer_id, game_id=item['game_id'], kind=WalletEntry.PURCHASE,
+                                    amount_cents=-to_cents(item['price'])) for item in buying])
+        enqueue_purchase(gamer_id, [(item['game_id'], item['price']) for item in buying])
+        add_game_ids(LIBRARY, gamer_id, [item['game_id'] for item in buying])
+    return items, total
+
+
+def checkout_cart(gamer_id, game_ids):
+    """
+    Покупка нескольких игр одной транзакцией: цены и владение определяются двумя запросами
+    на всю корзину, кошелек списывается один раз на общую сумму, строки Library и Purchase
+    вставляются пачкой. Владение проверяется по кэшу набора игр библиотеки; если он устарел
+    или параллельная покупка успела добавить игру в библиотеку, уникальное ограничение
+    откатывает транзакцию, кэш сбрасывается и корзина разбирается заново.
+    Возвращает (результаты по каждой игре, списанная сумма).
+    """
+    game_ids = list(dict.fromkeys(game_ids))
+    for attempt in range(CHECKOUT_ATTEMPTS):
+        try:
+            return _checkout_once(gamer_id, game_ids)
+        except IntegrityError:
+            if attempt == CHECKOUT_ATTEMPTS - 1:
+                raise
+            invalidate(LIBRARY, gamer_id)
@@ -0,0 +1,99 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from egames.models import GenreGame, Purchase, SalesRollup
+from egames.wallet import from_cents, to_cents
+
+REBUILD_BATCH_SIZE = 500
+TOP_SELLERS_LIMIT = 10
+MAX_TOP_SELLERS_LIMIT = 100
+MAX_REPORT_DAYS = 366
+REPORT_ORDERINGS = ('purchases', 'revenue')
+
+
+# ================================== ПОПОЛНЕНИЕ ==================================
+def record_sales(sales, day=None):
+    """
+    Учитывает покупки в дневных итогах: sales - список пар (id игры, цена).
+    Вызывается обработчиком очереди событий о покупках. Недостающие строки дня вставляются одним запросом
+    с игнорированием конфликтов, затем счетчики увеличиваются через F() одним UPDATE
+    на каждую пару (количество, сумма), поэтому параллельные покупки не теряют продаж.
+    """
+    day = day or timezone.localdate()
+    counts = Counter(game_id for game_id, _ in sales)
+    revenue = defaultdict(int)
+    for game_id, price in sales:
+        revenue[game_id] += to_cents(price)
+    SalesRollup.objects.bulk_create([SalesRollup(game_id=game_id, day=day) for game_id in counts],
+                                    ignore_conflicts=True)
+    increments = defaultdict(list)
+    for game_id, count in counts.items():
+        increments[(count, revenue[game_id])].append(game_id)
+    for (count, cents), game_ids in increments.items():
+        SalesRollup.objects.filter(game_id__in=game_ids, day=day).update(
+            purchases=F('purchases') + count, revenue_cents=F('revenue_cents') + cents)
+
+
+def rebuild_rollups(day_from=None):
+    """Пересчитывает дневные итоги по таблице покупок начиная с day_from (или целиком)."""
+    purchases = Purchase.objects.all()
+    rollups = SalesRollup.objects.all()
+    if day_from is not None:
+        purchases = purchases.filter(timestamp__date__gte=day_from)
+        rollups = rollups.filter(day__gte=day_from)
+    rows = (purchases.annotate(day=TruncDate('timestamp')).values('game_id', 'day')
+            .annotate(count=Count('id'), total=Sum('price')).order_by())
+    with transaction.atomic():
+        rollups.delete()
+        created = SalesRollup.objects.bulk_create(
+            (SalesRollup(game_id=row['game_id'], day=row['day'], purchases=row['count'],
+                         revenue_cents=to_cents(row['total'])) for row in rows),
+            batch_size=REBUILD_BATCH_SIZE)
+    return len(created)
+
+
+# ================================== ОТЧЕТЫ ==================================
+def _period(day_from, day_to):
+    return SalesRollup.objects.filter(day__gte=day_from, day__lte=day_to)
+
+
+def top_sellers(day_from, day_to, order='purchases', limit=TOP_SELLERS_LIMIT):
+    ordering = ('-purchases', '-revenue') if order == 'purchases' else ('-revenue', '-purchases')
+    rows = (_period(day_from, day_to).values('game_id', 'game__title')
+            .annotate(purchases=Sum('purchases'), revenue=Sum('revenue_cents'))
+            .order_by(*ordering, 'game_id')[:limit])
+    return [{'game_id': row['game_id'], 'title': row['game__title'], 'purchases': row['purchases'],
+             'revenue': from_cents(row['revenue'])} for row in rows]
+
+
+def revenue_by_genre(day_from, day_to):
+    # Игра с несколькими жанрами учитывается в каждом из них
+    rows = (GenreGame.objects.filter(genre__is_deleted=False, game__salesrollup__day__gte=day_from,
+                                     game__salesrollup__day__lte=day_to)
+            .values('genre_id', 'genre__title_genre')
+            .annotate(purchases=Sum('game__salesrollup__purchases'), revenue=Sum('game__salesrollup__revenue_cents'))
+            .order_by('-revenue', 'genre_id'))
+    return [{'genre_id': row['genre_id'], 'title_genre': row['genre__title_genre'], 'purchases': row['purchases'],
+             'revenue': from_cents(row['revenue'])} for row in rows]
+
+
+def sales_series(day_from, day_to, game_id=None):
+    """Продажи по дням периода; дни без продаж возвращаются с нулями."""
+    rollups = _period(day_from, day_to)
+    if game_id is not None:
+        rollups = rollups.filter(game_id=game_id)
+    totals = {row['day']: row for row in (rollups.values('day')
+                                          .annotate(purchases=Sum('purchases'), revenue=Sum('revenue_cents'))
+                                          .order_by())}
+    series = []
+    for offset in range((day_to - day_from).days + 1):
+        day = day_from + timedelta(days=offset)
+        row = totals.get(day)
+        series.append({'day': day.isoformat(), 'purchases': row['purchases'] if row else 0,
+                       'revenue': from_cents(row['revenue']) if row else 0})
+    return series
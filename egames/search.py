@@ -0,0 +1,84 @@
+import re
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Q
+
+from egames.models import Game, GenreGame
+
+FTS_TABLE = 'egames_game_fts'
+# Веса столбцов для bm25: совпадение в названии важнее совпадения в жанре и описании
+FTS_WEIGHTS = (10.0, 1.0, 3.0)
+INDEX_CHUNK_SIZE = 500
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def build_match_expression(query):
+    # Каждое слово экранируется как строка FTS5 и ищется по префиксу,
+    # поэтому пользовательский ввод не может сломать синтаксис MATCH
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def index_games(game_ids):
+    """
+    Перестраивает записи поискового индекса для указанных игр.
+    Удаленные игры из индекса убираются, поэтому функцию достаточно вызвать
+    после любого изменения игры, ее жанров или статуса.
+    """
+    if not fts_available():
+        return
+    game_ids = list(game_ids)
+    for start in range(0, len(game_ids), INDEX_CHUNK_SIZE):
+        chunk = game_ids[start:start + INDEX_CHUNK_SIZE]
+        genres = defaultdict(list)
+        links = (GenreGame.objects.filter(game_id__in=chunk, genre__is_deleted=False)
+                 .values_list('game_id', 'genre__title_genre'))
+        for game_id, title_genre in links:
+            genres[game_id].append(title_genre)
+        rows = [(game_id, title, description, ' '.join(genres[game_id]))
+                for game_id, title, description in (Game.objects.filter(id__in=chunk, is_deleted=False)
+                                                    .values_list('id', 'title', 'description'))]
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(game_id,) for game_id in chunk])
+            cursor.executemany(f'INSERT INTO {FTS_TABLE}(rowid, title, description, genres) '
+                               f'VALUES (%s, %s, %s, %s)', rows)
+
+
+def index_genre_games(genre):
+    index_games(genre.game.values_list('id', flat=True))
+
+
+def rebuild_index():
+    if not fts_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    game_ids = list(Game.objects.filter(is_deleted=False).values_list('id', flat=True))
+    index_games(game_ids)
+    return len(game_ids)
+
+
+def search_games(query, limit, offset=0):
+    """Возвращает список пар (id игры, релевантность), лучшие совпадения первыми."""
+    expression = build_match_expression(query)
+    if not expression:
+        return []
+    if not fts_available():
+        words = re.findall(r'\w+', query)
+        condition = Q()
+        for word in words:
+            condition &= (Q(title__icontains=word) | Q(description__icontains=word) |
+                          Q(genre__title_genre__icontains=word, genre__is_deleted=False))
+        game_ids = (Game.objects.filter(condition, is_deleted=False).distinct()
+                    .order_by('id').values_list('id', flat=True)[offset:offset + limit])
+        return [(game_id, None) for game_id in game_ids]
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT rowid, -bm25({FTS_TABLE}, {weights}) AS score FROM {FTS_TABLE} '
+                       f'WHERE {FTS_TABLE} MATCH %s ORDER BY score DESC, rowid LIMIT %s OFFSET %s',
+                       [expression, limit, offset])
+        return cursor.fetchall()
@@ -0,0 +1,81 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from egames.models import Game, Genre, GenreGame
+
+MAX_TAGGING_PAIRS = 10000
+TAGGING_BATCH_SIZE = 500
+
+
+def parse_tagging_pairs(data):
+    """
+    Принимает либо список пар pairs: [{"game_id": ..., "genre_id": ...}],
+    либо один genre_id со списком game_ids. Возвращает список уникальных пар (game_id, genre_id).
+    Некорректные данные приводят к ValueError.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Тело запроса должно быть JSON-объектом.')
+    pairs = data.get('pairs')
+    genre_id = data.get('genre_id')
+    game_ids = data.get('game_ids')
+    if (pairs is None) == (genre_id is None or game_ids is None):
+        raise ValueError('Укажите pairs, либо genre_id вместе с game_ids.')
+    if not isinstance(pairs if pairs is not None else game_ids, list):
+        raise ValueError('Поля pairs и game_ids должны быть списками.')
+    try:
+        if pairs is not None:
+            result = [(int(pair['game_id']), int(pair['genre_id'])) for pair in pairs]
+        else:
+            result = [(int(game_id), int(genre_id)) for game_id in game_ids]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Поля game_id и genre_id должны содержать только числа.')
+    result = list(dict.fromkeys(result))
+    if not result:
+        raise ValueError('Список пар не может быть пустым.')
+    if len(result) > MAX_TAGGING_PAIRS:
+        raise ValueError(f'За один запрос можно изменить не более {MAX_TAGGING_PAIRS} пар.')
+    return result
+
+
+def find_missing(pairs):
+    """Проверяет все id одним in_bulk на модель. Возвращает (отсутствующие игры, отсутствующие жанры)."""
+    game_ids = {game_id for game_id, _ in pairs}
+    genre_ids = {genre_id for _, genre_id in pairs}
+    games = Game.objects.filter(is_deleted=False).only('id').in_bulk(game_ids)
+    genres = Genre.objects.filter(is_deleted=False).only('id').in_bulk(genre_ids)
+    return sorted(game_ids - games.keys()), sorted(genre_ids - genres.keys())
+
+
+def _pairs_condition(pairs):
+    games_by_genre = defaultdict(list)
+    for game_id, genre_id in pairs:
+        games_by_genre[genre_id].append(game_id)
+    condition = Q()
+    for genre_id, game_ids in games_by_genre.items():
+        condition |= Q(genre_id=genre_id, game_id__in=game_ids)
+    return condition
+
+
+def tag_games(pairs):
+    """Добавляет жанры к играм. Уже существующие связи пропускаются. Возвращает число новых связей."""
+    with transaction.atomic():
+        existing = set()
+        for start in range(0, len(pairs), TAGGING_BATCH_SIZE):
+            chunk = pairs[start:start + TAGGING_BATCH_SIZE]
+            existing.update(GenreGame.objects.filter(_pairs_condition(chunk)).values_list('game_id', 'genre_id'))
+        links = [GenreGame(game_id=game_id, genre_id=genre_id)
+                 for game_id, genre_id in pairs if (game_id, genre_id) not in existing]
+        GenreGame.objects.bulk_create(links, batch_size=TAGGING_BATCH_SIZE, ignore_conflicts=True)
+    return len(links)
+
+
+def untag_games(pairs):
+    """Удаляет жанры из игр. Возвращает число удаленных связей."""
+    deleted = 0
+    with transaction.atomic():
+        for start in range(0, len(pairs), TAGGING_BATCH_SIZE):
+            chunk = pairs[start:start + TAGGING_BATCH_SIZE]
+            deleted += GenreGame.objects.filter(_pairs_condition(chunk)).delete()[0]
+    return deleted
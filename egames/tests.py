@@ -0,0 +1,958 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from egames import catalog_io, images, outbox, search, wallet
+from egames.api.cards import refresh_game_cards
+from egames.api.idempotency import IN_PROGRESS_TIMEOUT, KEY_TTL
+from egames.api.pagination import encode_cursor
+from egames.cache import LocalLRUCache, SingleFlight, local_cache
+from egames.campaigns import apply_campaign_prices, rebuild_price_timeline
+from egames.models import (DiscountCampaign, Friend, Game, GameCard, Gamer, GamePriceWindow, Genre, GenreGame,
+                           IdempotencyKey, Library, OutboxEvent, PriceChange, Purchase, Review, Role, SalesRollup,
+                           Staff, WalletEntry, WalletSnapshot, Wishlist, WishlistPriceDrop)
+from egames.ownership import LIBRARY, get_game_ids
+from egames.price_drops import detect_price_drops
+from egames.purchases import ALREADY_OWNED, PURCHASED, AlreadyOwned, InsufficientFunds, buy_game, checkout_cart
+from egames.sales import rebuild_rollups
+
+
+class StoreTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.gamer = Gamer.objects.create_user(username='gamer', password='x', wallet=100)
+        self.games = [Game.objects.create(title=f'Game {i}', price=10 * i, description='d') for i in range(1, 4)]
+
+    def wallet(self):
+        return Gamer.objects.get(id=self.gamer.id).wallet
+
+
+class ApiTestCase(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        role = Role.objects.create(role_name='admin')
+        self.admin = Staff.objects.create_user(username='admin', password='x', is_staff=True, role=role)
+        self.admin_client = self.client_for(self.admin)
+        self.gamer_client = self.client_for(self.gamer)
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+# ================================== ОТЧЕТЫ ПО ПРОДАЖАМ ==================================
+class SalesRollupTests(ApiTestCase):
+    def rollups(self):
+        return set(SalesRollup.objects.values_list('game_id', 'day', 'purchases', 'revenue_cents'))
+
+    def test_drained_purchases_land_in_daily_rollups(self):
+        first, second, _ = self.games
+        other = Gamer.objects.create_user(username='other', password='x', wallet=100)
+        buy_game(self.gamer.id, first.id)
+        checkout_cart(other.id, [first.id, second.id])
+        self.assertFalse(SalesRollup.objects.exists())
+        outbox.drain_all()
+        today = timezone.localdate()
+        self.assertEqual(self.rollups(), {(first.id, today, 2, 2000), (second.id, today, 1, 2000)})
+        response = self.admin_client.get(reverse('sales-top-sellers'))
+        self.assertEqual([(game['game_id'], game['purchases'], game['revenue']) for game in response.json()['games']],
+                         [(first.id, 2, 20), (second.id, 1, 20)])
+
+    def test_sale_is_counted_on_purchase_day(self):
+        game = self.games[0]
+        buy_game(self.gamer.id, game.id)
+        yesterday = timezone.localdate() - timedelta(days=1)
+        event = OutboxEvent.objects.get()
+        OutboxEvent.objects.filter(id=event.id).update(payload={**event.payload, 'day': yesterday.isoformat()})
+        outbox.drain_all()
+        self.assertEqual(self.rollups(), {(game.id, yesterday, 1, 1000)})
+
+    def test_rebuild_matches_drained_rollups(self):
+        buy_game(self.gamer.id, self.games[0].id)
+        buy_game(self.gamer.id, self.games[1].id)
+        outbox.drain_all()
+        drained = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(self.rollups(), drained)
+
+
+# ================================== КЭШ ОТВЕТОВ ==================================
+class ResponseCacheTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        local_cache.clear()
+
+    def listed_games(self):
+        return {game['id']: game for game in self.gamer_client.get(reverse('games-list')).json()['games']}
+
+    def test_repeated_request_is_served_from_cache(self):
+        with self.assertLogs('egames.cache', 'INFO') as logs:
+            self.listed_games()
+            self.listed_games()
+        self.assertEqual([line.rsplit(' - ', 1)[1] for line in logs.output], ['built', 'local'])
+
+    def test_game_update_invalidates_games_list(self):
+        game = self.games[0]
+        self.listed_games()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin_client.put(reverse('update-game', args=[game.id]), {'title': 'Renamed'}, format='json')
+        self.assertEqual(self.listed_games()[game.id]['title'], 'Renamed')
+
+    def test_review_invalidates_games_list(self):
+        game = self.games[0]
+        self.listed_games()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gamer_client.post(reverse('add-review-to-game', args=[game.id]), {'rating': 80, 'comment': 'ok'},
+                                   format='json')
+        self.assertEqual(self.listed_games()[game.id]['review_count'], 1)
+
+    def test_genre_create_invalidates_genres_list(self):
+        def titles():
+            return [genre['title_genre'] for genre in self.gamer_client.get(reverse('genres-list')).json()['genres']]
+
+        self.assertEqual(titles(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin_client.post(reverse('create-genre'), {'title_genre': 'RPG', 'description': 'd'}, format='json')
+        self.assertEqual(titles(), ['RPG'])
+
+    def test_concurrent_misses_build_once(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def build():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'entry'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', build)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flight.do('key', build))) for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        # Даем ведомым вызовам дойти до ожидания результата ведущего
+        time.sleep(0.1)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['entry'] * 4)
+
+    def test_local_cache_evicts_least_recently_used(self):
+        lru = LocalLRUCache(max_entries=2, max_bytes=1024)
+        lru.set('a', (200, b'a'))
+        lru.set('b', (200, b'b'))
+        lru.get('a')
+        lru.set('c', (200, b'c'))
+        self.assertIsNone(lru.get('b'))
+        self.assertIsNotNone(lru.get('a'))
+
+
+# ================================== УСЛОВНЫЕ ЗАПРОСЫ ==================================
+class ConditionalGetTests(ApiTestCase):
+    def test_matching_etag_returns_304(self):
+        first = self.gamer_client.get(reverse('games-list'))
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Last-Modified', first)
+        second = self.gamer_client.get(reverse('games-list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_etag_depends_on_query(self):
+        first = self.gamer_client.get(reverse('games-list'))
+        other = self.gamer_client.get(reverse('games-list'), {'ordering': 'rating'}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(other.status_code, 200)
+        self.assertNotEqual(other['ETag'], first['ETag'])
+
+    def test_catalog_write_changes_etag(self):
+        first = self.gamer_client.get(reverse('games-list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin_client.put(reverse('update-game', args=[self.games[0].id]), {'title': 'Renamed'},
+                                  format='json')
+        second = self.gamer_client.get(reverse('games-list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(self.gamer_client.get(reverse('games-list'), HTTP_IF_NONE_MATCH=second['ETag']).status_code,
+                         304)
+
+    def test_purchase_changes_library_etag(self):
+        first = self.gamer_client.get(reverse('gamer-library'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gamer_client.post(reverse('buy-and-add-to-library'), {'game_id': self.games[0].id}, format='json')
+        second = self.gamer_client.get(reverse('gamer-library'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(len(second.json()['library']), 1)
+
+    def test_library_etag_is_per_gamer(self):
+        other = Gamer.objects.create_user(username='other', password='x')
+        first = self.gamer_client.get(reverse('gamer-library'))
+        response = self.client_for(other).get(reverse('gamer-library'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+
+# ================================== ВЫБОРОЧНЫЕ ПОЛЯ ==================================
+class SparseFieldsTests(ApiTestCase):
+    def test_unknown_nested_field_of_method_field_returns_400(self):
+        response = self.gamer_client.get(reverse('games-list'), {'fields': 'id,reviews.foo'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_nested_field_in_library_returns_400(self):
+        response = self.gamer_client.get(reverse('gamer-library'), {'fields': 'game.reviews.foo'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_empty_field_list_returns_400(self):
+        for value in ('', ' , '):
+            with self.subTest(fields=value):
+                response = self.gamer_client.get(reverse('games-list'), {'fields': value})
+                self.assertEqual(response.status_code, 400)
+
+    def test_unknown_field_returns_400(self):
+        response = self.gamer_client.get(reverse('games-list'), {'fields': 'id,nosuch'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('nosuch', response.json()['message'])
+
+    def test_write_only_field_returns_400(self):
+        response = self.gamer_client.get(reverse('get-all-gamers'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_selected_fields_only(self):
+        response = self.gamer_client.get(reverse('games-list'), {'fields': 'id,title'})
+        self.assertEqual(response.json()['games'][0], {'id': self.games[0].id, 'title': 'Game 1'})
+
+    def test_known_nested_field_of_method_field(self):
+        response = self.gamer_client.get(reverse('games-list'),
+                                         {'fields': 'id,reviews.rating', 'expand': 'reviews'})
+        self.assertEqual(response.status_code, 200)
+
+
+# ================================== ПАГИНАЦИЯ ==================================
+class CursorTests(ApiTestCase):
+    def test_tampered_cursor_returns_400(self):
+        for values in ([{}], [[1]], [True], [None]):
+            cursor = encode_cursor(values)
+            with self.subTest(values=values):
+                response = self.gamer_client.get(reverse('games-list'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+
+    def test_cursor_with_bad_date_returns_400(self):
+        response = self.gamer_client.get(reverse('get-purchases'), {'cursor': encode_cursor(['not a date', 1])})
+        self.assertEqual(response.status_code, 400)
+
+    def test_next_cursor_continues_listing(self):
+        first = self.gamer_client.get(reverse('games-list'), {'page_size': 2}).json()
+        second = self.gamer_client.get(reverse('games-list'), {'page_size': 2, 'cursor': first['next_cursor']}).json()
+        ids = [game['id'] for game in first['games'] + second['games']]
+        self.assertEqual(sorted(ids), sorted(game.id for game in self.games))
+        self.assertIsNone(second['next_cursor'])
+
+
+# ================================== ПОКУПКИ ==================================
+class BuyGameTests(StoreTestCase):
+    def test_duplicate_purchase_is_rejected_without_second_debit(self):
+        game = self.games[0]
+        buy_game(self.gamer.id, game.id)
+        with self.assertRaises(AlreadyOwned):
+            buy_game(self.gamer.id, game.id)
+        self.assertEqual(self.wallet(), 90)
+        self.assertEqual(Purchase.objects.filter(gamer=self.gamer).count(), 1)
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    def test_stale_ownership_cache_is_caught_by_constraint(self):
+        game = self.games[0]
+        get_game_ids(LIBRARY, self.gamer.id)
+        Library.objects.create(gamer=self.gamer, game=game)
+        with self.assertRaises(AlreadyOwned):
+            buy_game(self.gamer.id, game.id)
+        self.assertEqual(self.wallet(), 100)
+        self.assertFalse(Purchase.objects.exists())
+        self.assertFalse(WalletEntry.objects.filter(kind=WalletEntry.PURCHASE).exists())
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_insufficient_funds_writes_nothing(self):
+        Gamer.objects.filter(id=self.gamer.id).update(wallet=5)
+        with self.assertRaises(InsufficientFunds):
+            buy_game(self.gamer.id, self.games[0].id)
+        self.assertFalse(Library.objects.exists())
+        self.assertFalse(Purchase.objects.exists())
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
+class PurchaseHistoryTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        moments = [datetime(2024, 1, 10, 12), datetime(2024, 1, 15, 23, 30), datetime(2024, 1, 20, 8)]
+        self.purchases = []
+        for game, moment in zip(self.games, moments):
+            purchase = Purchase.objects.create(gamer=self.gamer, game=game, price=game.price)
+            Purchase.objects.filter(id=purchase.id).update(timestamp=timezone.make_aware(moment))
+            self.purchases.append(purchase)
+
+    def listed(self, **params):
+        response = self.gamer_client.get(reverse('get-purchases'), params)
+        self.assertEqual(response.status_code, 200)
+        return [purchase['id'] for purchase in response.json()['purchases']]
+
+    def test_date_to_includes_whole_day(self):
+        self.assertEqual(self.listed(date_from='2024-01-15', date_to='2024-01-15'), [self.purchases[1].id])
+
+    def test_open_ranges_and_datetimes(self):
+        self.assertEqual(self.listed(date_from='2024-01-11'), [self.purchases[2].id, self.purchases[1].id])
+        self.assertEqual(self.listed(date_to='2024-01-15T12:00:00'), [self.purchases[0].id])
+
+    def test_other_gamers_purchases_are_hidden(self):
+        other = Gamer.objects.create_user(username='other', password='x')
+        response = self.client_for(other).get(reverse('get-purchases'))
+        self.assertEqual(response.json()['purchases'], [])
+
+    def test_bad_date_returns_400(self):
+        for value in ('yesterday', '2024-02-30', '2024-13-01T00:00'):
+            with self.subTest(value=value):
+                response = self.gamer_client.get(reverse('get-purchases'), {'date_from': value})
+                self.assertEqual(response.status_code, 400)
+
+
+class OwnershipTests(ApiTestCase):
+    def ownership(self):
+        response = self.gamer_client.post(reverse('gamer-ownership'),
+                                          {'game_ids': [game.id for game in self.games]}, format='json')
+        return response.json()
+
+    def test_buy_updates_cached_ownership(self):
+        game = self.games[0]
+        self.assertEqual(self.ownership(), {'owned': [], 'wishlisted': []})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gamer_client.post(reverse('buy-and-add-to-library'), {'game_id': game.id}, format='json')
+        self.assertEqual(self.ownership()['owned'], [game.id])
+
+    def test_checkout_updates_cached_ownership(self):
+        self.ownership()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gamer_client.post(reverse('checkout-cart'), {'game_ids': [self.games[1].id, self.games[2].id]},
+                                   format='json')
+        self.assertEqual(self.ownership()['owned'], [self.games[1].id, self.games[2].id])
+
+    def test_wishlist_changes_update_cached_ownership(self):
+        game = self.games[2]
+        self.ownership()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gamer_client.post(reverse('add-to-wishlist'), {'game_id': game.id}, format='json')
+        self.assertEqual(self.ownership()['wishlisted'], [game.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gamer_client.delete(reverse('delete-from-wishlist'), {'game_id': game.id}, format='json')
+        self.assertEqual(self.ownership()['wishlisted'], [])
+
+    def test_unknown_ids_are_not_owned(self):
+        response = self.gamer_client.post(reverse('gamer-ownership'), {'game_ids': [10 ** 6]}, format='json')
+        self.assertEqual(response.json(), {'owned': [], 'wishlisted': []})
+
+
+class CheckoutCartTests(StoreTestCase):
+    def test_checkout_retries_after_integrity_error(self):
+        owned, first, second = self.games
+        # Кэш владения загружен до того, как игра попала в библиотеку в обход него
+        get_game_ids(LIBRARY, self.gamer.id)
+        Library.objects.create(gamer=self.gamer, game=owned)
+        items, total = checkout_cart(self.gamer.id, [owned.id, first.id, second.id])
+        statuses = {item['game_id']: item['status'] for item in items}
+        self.assertEqual(statuses, {owned.id: ALREADY_OWNED, first.id: PURCHASED, second.id: PURCHASED})
+        self.assertEqual(total, 50)
+        self.assertEqual(self.wallet(), 50)
+        self.assertEqual(Purchase.objects.filter(gamer=self.gamer).count(), 2)
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    def test_checkout_with_insufficient_funds_writes_nothing(self):
+        Gamer.objects.filter(id=self.gamer.id).update(wallet=20)
+        with self.assertRaises(InsufficientFunds):
+            checkout_cart(self.gamer.id, [game.id for game in self.games])
+        self.assertEqual(self.wallet(), 20)
+        self.assertFalse(Library.objects.exists())
+        self.assertFalse(Purchase.objects.exists())
+
+
+# ================================== ОЧЕРЕДЬ СОБЫТИЙ ==================================
+class OutboxTests(StoreTestCase):
+    def purchase_event(self, game, price=10):
+        outbox.enqueue_purchase(self.gamer.id, [(game.id, price)])
+        return OutboxEvent.objects.latest('id')
+
+    def test_drain_records_sale_once_and_clears_wishlist(self):
+        game = self.games[0]
+        Wishlist.objects.create(gamer=self.gamer, game=game)
+        self.purchase_event(game)
+        self.assertEqual(outbox.drain_all(), 1)
+        self.assertEqual(outbox.drain_all(), 0)
+        rollup = SalesRollup.objects.get(game=game)
+        self.assertEqual((rollup.purchases, rollup.revenue_cents), (1, 1000))
+        self.assertFalse(Wishlist.objects.exists())
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_claimed_event_is_not_claimed_twice(self):
+        event = self.purchase_event(self.games[0])
+        now = timezone.now()
+        _, first = outbox._claim_batch(10, now)
+        _, second = outbox._claim_batch(10, now)
+        self.assertEqual([e.id for e in first], [event.id])
+        self.assertEqual(second, [])
+
+    def test_lost_lease_rolls_back_handler_writes(self):
+        game = self.games[0]
+        self.purchase_event(game)
+        now = timezone.now()
+        stale_token, events = outbox._claim_batch(10, now)
+        # Аренда истекла, и событие забрал другой обработчик
+        _, reclaimed = outbox._claim_batch(10, now + outbox.CLAIM_LEASE + timedelta(seconds=1))
+        self.assertEqual(len(reclaimed), 1)
+        with self.assertRaises(outbox.LeaseLost):
+            outbox._process(outbox.PURCHASE_COMPLETED, events, stale_token)
+        self.assertFalse(SalesRollup.objects.exists())
+        self.assertEqual(OutboxEvent.objects.get().attempts, 2)
+
+    def test_failing_event_is_postponed_without_blocking_batch(self):
+        good, bad = self.purchase_event(self.games[0]), self.purchase_event(self.games[1])
+        real_handler = outbox.handle_purchases
+
+        def handler(payloads):
+            if any(payload['sales'][0][0] == self.games[1].id for payload in payloads):
+                raise RuntimeError('boom')
+            real_handler(payloads)
+
+        before = timezone.now()
+        with mock.patch.dict(outbox.HANDLERS, {outbox.PURCHASE_COMPLETED: handler}):
+            claimed, processed = outbox.drain()
+        self.assertEqual((claimed, processed), (2, 1))
+        self.assertFalse(OutboxEvent.objects.filter(id=good.id).exists())
+        bad.refresh_from_db()
+        self.assertEqual(bad.attempts, 1)
+        self.assertIn('boom', bad.last_error)
+        self.assertGreaterEqual(bad.available_at, before + outbox.RETRY_BASE_DELAY)
+        self.assertEqual(SalesRollup.objects.get().game_id, self.games[0].id)
+
+    def test_retry_delay_grows_and_is_capped(self):
+        self.assertEqual(outbox._retry_delay(1), outbox.RETRY_BASE_DELAY)
+        self.assertEqual(outbox._retry_delay(3), outbox.RETRY_BASE_DELAY * 4)
+        self.assertEqual(outbox._retry_delay(50), outbox.RETRY_MAX_DELAY)
+
+    def test_event_is_not_claimed_after_max_attempts(self):
+        event = self.purchase_event(self.games[0])
+        OutboxEvent.objects.filter(id=event.id).update(attempts=outbox.MAX_ATTEMPTS)
+        self.assertEqual(outbox.drain(), (0, 0))
+        self.assertTrue(OutboxEvent.objects.filter(id=event.id).exists())
+
+
+# ================================== ИДЕМПОТЕНТНОСТЬ ==================================
+class IdempotencyTests(ApiTestCase):
+    def deposit(self, amount, key='key-1'):
+        return self.gamer_client.post(reverse('wallet-deposit'), {'amount': amount}, format='json',
+                                      HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_first_request_is_stored(self):
+        response = self.deposit(10)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+        stored = IdempotencyKey.objects.get()
+        self.assertEqual(stored.status_code, 200)
+        self.assertEqual(self.wallet(), 110)
+
+    def test_replay_returns_stored_response_without_second_deposit(self):
+        first = self.deposit(10)
+        replay = self.deposit(10)
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(self.wallet(), 110)
+
+    def test_same_key_with_other_body_returns_422(self):
+        self.deposit(10)
+        self.assertEqual(self.deposit(20).status_code, 422)
+        self.assertEqual(self.wallet(), 110)
+
+    def test_key_in_progress_returns_409(self):
+        self.deposit(10)
+        IdempotencyKey.objects.update(status_code=None, response=None)
+        self.assertEqual(self.deposit(10).status_code, 409)
+        self.assertEqual(self.wallet(), 110)
+
+    def test_abandoned_key_can_be_claimed_again(self):
+        self.deposit(10)
+        IdempotencyKey.objects.update(status_code=None, response=None,
+                                      created_at=timezone.now() - IN_PROGRESS_TIMEOUT - timedelta(seconds=1))
+        response = self.deposit(10)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(self.wallet(), 120)
+
+    def test_purge_removes_only_expired_keys(self):
+        self.deposit(10, key='old')
+        IdempotencyKey.objects.update(created_at=timezone.now() - KEY_TTL - timedelta(seconds=1))
+        self.deposit(10, key='new')
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+        # Просроченный ключ снова выполняет запрос, а не повторяет ответ
+        self.assertNotIn('Idempotent-Replayed', self.deposit(10, key='old'))
+        self.assertEqual(self.wallet(), 130)
+
+
+# ================================== КОШЕЛЁК ==================================
+class WalletDepositTests(ApiTestCase):
+    def test_non_finite_amount_returns_400(self):
+        for amount in ('nan', 'inf', '-inf'):
+            with self.subTest(amount=amount):
+                response = self.gamer_client.post(reverse('wallet-deposit'), {'amount': amount}, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.wallet(), 100)
+
+
+class WalletSnapshotTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        # Геймер без начального баланса: в журнале только записи самого теста
+        self.owner = Gamer.objects.create_user(username='owner', password='x')
+
+    def entry(self, amount_cents, age):
+        entry = WalletEntry.objects.create(gamer=self.owner, amount_cents=amount_cents, kind=WalletEntry.DEPOSIT)
+        WalletEntry.objects.filter(id=entry.id).update(created_at=timezone.now() - age)
+        return entry
+
+    def test_fresh_entries_stay_out_of_snapshot(self):
+        old = self.entry(100, timedelta(hours=1))
+        self.entry(200, timedelta(seconds=1))
+        self.assertEqual(wallet.take_snapshots(min_tail=1), 1)
+        snapshot = WalletSnapshot.objects.get()
+        self.assertEqual((snapshot.last_entry_id, snapshot.balance_cents), (old.id, 100))
+        self.assertEqual(wallet.ledger_balance_cents(self.owner.id), 300)
+
+    def test_late_entry_below_boundary_is_not_lost(self):
+        # Запись с меньшим id могла закоммититься позже; снимок всё равно учитывает её по id
+        early = self.entry(100, timedelta(seconds=1))
+        late = self.entry(200, timedelta(hours=1))
+        self.assertEqual(wallet.take_snapshots(min_tail=1), 1)
+        snapshot = WalletSnapshot.objects.get()
+        self.assertEqual((snapshot.last_entry_id, snapshot.balance_cents), (late.id, 300))
+        self.assertGreater(late.id, early.id)
+        self.assertEqual(wallet.ledger_balance_cents(self.owner.id), 300)
+
+    def test_only_fresh_entries_are_not_snapshotted(self):
+        self.entry(100, timedelta(seconds=1))
+        self.assertEqual(wallet.take_snapshots(min_tail=1), 0)
+        self.assertEqual(wallet.ledger_balance_cents(self.owner.id), 100)
+
+
+class WalletLedgerTests(ApiTestCase):
+    def assert_ledger_matches_wallet(self, gamer):
+        self.assertEqual(wallet.find_mismatches(), [])
+        history = self.client_for(gamer).get(reverse('wallet-history')).json()
+        self.assertEqual(history['balance'], Gamer.objects.get(id=gamer.id).wallet)
+        self.assertEqual(sum(entry['amount'] for entry in history['entries']), history['balance'])
+
+    def test_opening_balance_is_recorded_for_any_new_gamer(self):
+        gamer = Gamer.objects.create_user(username='direct', password='x', wallet=75)
+        self.assertEqual(WalletEntry.objects.get(gamer=gamer).kind, WalletEntry.OPENING)
+        self.assert_ledger_matches_wallet(gamer)
+
+    def test_ledger_follows_deposits_and_purchases(self):
+        self.gamer_client.post(reverse('wallet-deposit'), {'amount': 12.5}, format='json')
+        buy_game(self.gamer.id, self.games[1].id)
+        checkout_cart(self.gamer.id, [self.games[0].id])
+        self.assertEqual(self.wallet(), 82.5)
+        self.assert_ledger_matches_wallet(self.gamer)
+
+    def test_profile_update_does_not_duplicate_opening_entry(self):
+        self.gamer.first_name = 'Renamed'
+        self.gamer.save()
+        self.assertEqual(WalletEntry.objects.filter(gamer=self.gamer).count(), 1)
+
+
+# ================================== ДРУЗЬЯ ==================================
+class FriendSuggestionTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        names = ['bob', 'carol', 'dave', 'erin', 'frank']
+        self.bob, self.carol, self.dave, self.erin, self.frank = [
+            Gamer.objects.create_user(username=name, password='x') for name in names]
+        self.link(self.gamer, self.bob, self.carol)
+        self.link(self.bob, self.dave, self.erin, self.frank)
+        self.link(self.carol, self.dave, self.gamer)
+        self.link(self.dave, self.bob, self.carol)
+        Gamer.objects.filter(id=self.frank.id).update(is_deleted=True)
+
+    @staticmethod
+    def link(gamer, *friends):
+        Friend.objects.bulk_create([Friend(gamer=gamer, friend=friend) for friend in friends])
+
+    def suggestions(self, **params):
+        response = self.gamer_client.get(reverse('friend-suggestions'), params)
+        return [(item['username'], item['mutual_friends']) for item in response.json()['suggestions']]
+
+    def test_suggestions_rank_by_mutual_friends(self):
+        # Сам геймер, его друзья и удаленные геймеры не предлагаются
+        self.assertEqual(self.suggestions(), [('dave', 2), ('erin', 1)])
+        self.assertEqual(self.suggestions(limit=1), [('dave', 2)])
+
+    def test_bad_limit_returns_400(self):
+        response = self.gamer_client.get(reverse('friend-suggestions'), {'limit': 0})
+        self.assertEqual(response.status_code, 400)
+
+    def test_mutual_friends(self):
+        response = self.gamer_client.get(reverse('mutual-friends', args=[self.dave.id]))
+        self.assertEqual([friend['username'] for friend in response.json()['friends']], ['bob', 'carol'])
+
+    def test_new_friend_drops_out_of_suggestions(self):
+        self.suggestions()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gamer_client.post(reverse('add-friend'), {'friend_id': self.dave.id}, format='json')
+        self.assertEqual(self.suggestions(), [('erin', 1)])
+
+
+# ================================== СНИЖЕНИЯ ЦЕН ==================================
+class PriceDropTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.game = self.games[0]
+        Wishlist.objects.create(gamer=self.gamer, game=self.game)
+        Gamer.objects.create_user(username='bystander', password='x')
+
+    def set_price(self, price):
+        self.admin_client.put(reverse('update-game', args=[self.game.id]), {'price': price}, format='json')
+        detect_price_drops()
+
+    def on_sale(self):
+        response = self.gamer_client.get(reverse('wishlist-on-sale'))
+        return [(drop['game'], drop['old_price'], drop['final_price']) for drop in response.json()['on_sale']]
+
+    def test_drop_is_reported_once_per_wishlist_entry(self):
+        self.set_price(6)
+        self.assertEqual(list(WishlistPriceDrop.objects.values_list('gamer_id', 'old_price', 'new_price')),
+                         [(self.gamer.id, 10, 6)])
+        self.assertEqual(self.on_sale(), [(self.game.id, 10, 6)])
+        self.assertFalse(PriceChange.objects.exists())
+
+    def test_repeated_drop_keeps_price_before_first_drop(self):
+        self.set_price(6)
+        self.set_price(4)
+        self.assertEqual(self.on_sale(), [(self.game.id, 10, 4)])
+
+    def test_partial_raise_keeps_notification(self):
+        self.set_price(4)
+        self.set_price(8)
+        self.assertEqual(self.on_sale(), [(self.game.id, 10, 8)])
+
+    def test_raise_to_old_price_removes_notification(self):
+        self.set_price(6)
+        self.set_price(10)
+        self.assertFalse(WishlistPriceDrop.objects.exists())
+        self.assertEqual(self.on_sale(), [])
+
+    def test_changes_within_one_batch_are_collapsed(self):
+        self.admin_client.put(reverse('update-game', args=[self.game.id]), {'price': 5}, format='json')
+        self.admin_client.put(reverse('update-game', args=[self.game.id]), {'price': 12}, format='json')
+        detect_price_drops()
+        self.assertFalse(WishlistPriceDrop.objects.exists())
+
+
+# ================================== КАТАЛОГ ==================================
+class GameFacetsTests(ApiTestCase):
+    def test_facets_respect_min_rating(self):
+        Game.objects.filter(id=self.games[0].id).update(rating_avg=90)
+        response = self.gamer_client.get(reverse('games-list'), {'min_rating': 50})
+        self.assertEqual([game['id'] for game in response.json()['games']], [self.games[0].id])
+        self.assertEqual(sum(bucket['count'] for bucket in response.json()['facets']['price']), 1)
+
+
+class CoverUploadTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.media = self.settings(MEDIA_ROOT=media_root)
+        self.media.enable()
+        self.addCleanup(self.media.disable)
+        self.media_root = media_root
+
+    def stored_files(self):
+        return sorted(os.path.relpath(os.path.join(root, name), self.media_root)
+                      for root, _, names in os.walk(self.media_root) for name in names)
+
+    def create_game(self, title='Covered'):
+        buffer = BytesIO()
+        Image.new('RGB', (400, 300), 'red').save(buffer, format='PNG')
+        cover = SimpleUploadedFile('cover.png', buffer.getvalue(), content_type='image/png')
+        return self.admin_client.post(reverse('create-game'), {'title': title, 'price': 5, 'description': 'd',
+                                                               'cover_image': cover}, format='multipart')
+
+    def test_upload_stores_original_and_thumbnails(self):
+        response = self.create_game()
+        self.assertEqual(response.status_code, 201)
+        game = Game.objects.get(title='Covered')
+        self.assertEqual(len(self.stored_files()), 1 + len(images.THUMBNAIL_SIZES))
+        self.assertEqual(game.cover_image.name, f'covers/{game.cover_hash[:2]}/{game.cover_hash}.png')
+        self.assertEqual(set(response.json()['cover_thumbnails']), set(images.THUMBNAIL_SIZES))
+
+    def test_failed_thumbnail_leaves_nothing_behind(self):
+        real_make_thumbnail = images._make_thumbnail
+
+        def make_thumbnail(content, cover_hash, size):
+            if size == 'detail':
+                raise OSError('disk full')
+            return real_make_thumbnail(content, cover_hash, size)
+
+        with mock.patch.object(images, '_make_thumbnail', side_effect=make_thumbnail):
+            response = self.create_game()
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Game.objects.filter(title='Covered').exists())
+        self.assertEqual(self.stored_files(), [])
+
+
+class GameSearchTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.in_title = Game.objects.create(title='Dragon Rider', price=1, description='flying game')
+        self.in_description = Game.objects.create(title='Knights', price=1, description='slay a dragon')
+        self.in_genre = Game.objects.create(title='Castles', price=1, description='build walls')
+        self.deleted = Game.objects.create(title='Dragon Ghost', price=1, description='d', is_deleted=True)
+        genre = Genre.objects.create(title_genre='Dragonlike', description='d')
+        GenreGame.objects.create(game=self.in_genre, genre=genre)
+        search.rebuild_index()
+
+    def found(self, query):
+        response = self.gamer_client.get(reverse('game-search'), {'q': query})
+        return [game['id'] for game in response.json()['games']]
+
+    def test_matches_are_ranked_by_column_weight(self):
+        # Название весит больше жанра, жанр - больше описания (FTS_WEIGHTS)
+        self.assertEqual(self.found('dragon'), [self.in_title.id, self.in_genre.id, self.in_description.id])
+
+    def test_prefix_and_all_words_match(self):
+        self.assertEqual(self.found('drag rid'), [self.in_title.id])
+
+    def test_query_syntax_is_escaped(self):
+        response = self.gamer_client.get(reverse('game-search'), {'q': '"dragon* OR ('})
+        self.assertEqual(response.status_code, 200)
+
+    def test_icontains_fallback_without_fts(self):
+        with mock.patch.object(search, 'fts_available', return_value=False):
+            results = search.search_games('dragon', limit=10)
+        self.assertEqual(results, [(self.in_title.id, None), (self.in_description.id, None), (self.in_genre.id, None)])
+
+    def test_index_follows_game_update(self):
+        self.admin_client.put(reverse('update-game', args=[self.in_title.id]), {'title': 'Wyvern Rider'},
+                              format='json')
+        self.assertEqual(self.found('wyvern'), [self.in_title.id])
+
+
+class DiscountCampaignTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.game = self.games[0]
+        self.now = timezone.now()
+        genre = Genre.objects.create(title_genre='Sale', description='d')
+        GenreGame.objects.create(game=self.game, genre=genre)
+        self.small = self.campaign(20, -1, 2)
+        self.small.games.add(self.game)
+        self.big = self.campaign(50, 1, 3)
+        self.big.genres.add(genre)
+        # Вложенная кампания с меньшей скидкой не дробит окно большей
+        self.nested = self.campaign(10, 1.5, 2.5)
+        self.nested.games.add(self.game)
+        rebuild_price_timeline([self.game.id])
+
+    def campaign(self, discount, starts_in_hours, ends_in_hours):
+        return DiscountCampaign.objects.create(title=f'{discount}%', discount_percent=discount,
+                                               starts_at=self.now + timedelta(hours=starts_in_hours),
+                                               ends_at=self.now + timedelta(hours=ends_in_hours))
+
+    def test_overlapping_campaigns_use_largest_discount(self):
+        timeline = self.admin_client.get(reverse('game-price-timeline', args=[self.game.id])).json()['timeline']
+        self.assertEqual([(window['discount_percent'], window['final_price']) for window in timeline],
+                         [(20, 8), (50, 5)])
+        windows = list(GamePriceWindow.objects.filter(game=self.game).order_by('starts_at'))
+        self.assertEqual(windows[0].ends_at, self.big.starts_at)
+        self.assertEqual((windows[1].starts_at, windows[1].ends_at), (self.big.starts_at, self.big.ends_at))
+
+    def price_at(self, hours):
+        apply_campaign_prices(self.now + timedelta(hours=hours))
+        self.game.refresh_from_db()
+        return self.game.campaign_discount, self.game.final_price
+
+    def test_prices_follow_timeline(self):
+        self.assertEqual(self.price_at(0.1), (20, 8))
+        self.assertEqual(self.price_at(2), (50, 5))
+        self.assertEqual(self.price_at(4), (None, 10))
+        self.assertFalse(GamePriceWindow.objects.exists())
+
+    def test_deleted_campaign_leaves_timeline(self):
+        DiscountCampaign.objects.filter(id=self.big.id).update(is_deleted=True)
+        rebuild_price_timeline([self.game.id])
+        self.assertEqual(list(GamePriceWindow.objects.filter(game=self.game).order_by('starts_at')
+                              .values_list('discount_percent', flat=True)), [20, 10])
+
+
+class RepriceGamesTests(ApiTestCase):
+    def reprice(self, data):
+        return self.admin_client.post(reverse('reprice-games'), data, format='json')
+
+    def test_game_ids_must_be_a_list(self):
+        response = self.reprice({'discount_percent': 50, 'game_ids': '12'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Game.objects.get(id=self.games[0].id).price, 10)
+
+    def test_reprice_listed_games(self):
+        response = self.reprice({'discount_percent': 50, 'game_ids': [self.games[0].id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['changed'], 1)
+
+
+class BatchGenresTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.genre = Genre.objects.create(title_genre='Strategy', description='d')
+
+    def tag(self, data):
+        return self.admin_client.post(reverse('add-genres-to-games'), data, format='json')
+
+    def test_list_body_returns_400(self):
+        response = self.tag([{'game_id': self.games[0].id, 'genre_id': self.genre.id}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_game_ids_string_returns_400(self):
+        response = self.tag({'genre_id': self.genre.id, 'game_ids': '12'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.genre.game.exists())
+
+    def test_cards_show_new_genre(self):
+        game = self.games[0]
+        response = self.tag({'genre_id': self.genre.id, 'game_ids': [game.id]})
+        self.assertEqual(response.json()['created'], 1)
+        self.assertIn('Strategy', GameCard.objects.get(game=game).payload)
+
+
+class ReviewAggregatesTests(ApiTestCase):
+    def aggregates(self, game):
+        game.refresh_from_db()
+        return game.review_count, game.rating_sum, game.rating_avg
+
+    def review(self, client, method, name, game, **data):
+        return getattr(client, method)(reverse(name, args=[game.id]), data, format='json')
+
+    def test_aggregates_follow_add_edit_and_delete(self):
+        game = self.games[0]
+        other = self.client_for(Gamer.objects.create_user(username='other', password='x'))
+        self.review(self.gamer_client, 'post', 'add-review-to-game', game, rating=80, comment='good')
+        self.review(other, 'post', 'add-review-to-game', game, rating=60, comment='fine')
+        self.assertEqual(self.aggregates(game), (2, 140, 70))
+        self.review(other, 'put', 'edit-own-review', game, rating=100, comment='great')
+        self.assertEqual(self.aggregates(game), (2, 180, 90))
+        self.review(self.gamer_client, 'delete', 'delete-own-review', game)
+        self.assertEqual(self.aggregates(game), (1, 100, 100))
+        self.review(other, 'delete', 'delete-own-review', game)
+        self.assertEqual(self.aggregates(game), (0, 0, 0))
+
+    def test_duplicate_review_keeps_aggregates(self):
+        game = self.games[0]
+        self.review(self.gamer_client, 'post', 'add-review-to-game', game, rating=80, comment='good')
+        response = self.review(self.gamer_client, 'post', 'add-review-to-game', game, rating=10, comment='again')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.aggregates(game), (1, 80, 80))
+
+
+class ReviewFeedTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.game = self.games[0]
+        ratings = [50, 90, 50, 70, 90, 10]
+        self.reviews = [Review.objects.create(game=self.game, rating=rating, comment='c',
+                                              gamer=Gamer.objects.create_user(username=f'reviewer{i}', password='x'))
+                        for i, rating in enumerate(ratings)]
+        Review.objects.filter(id=self.reviews[-1].id).update(is_deleted=True)
+
+    def walk(self, ordering):
+        seen, cursor = [], None
+        while True:
+            params = {'ordering': ordering, 'page_size': 2, **({'cursor': cursor} if cursor else {})}
+            page = self.gamer_client.get(reverse('game-reviews', args=[self.game.id]), params).json()
+            seen.extend((review['gamer'], review['rating']) for review in page['reviews'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                return seen
+
+    def test_cursor_walks_rating_feed_without_gaps_or_repeats(self):
+        expected = [(review.gamer.username, review.rating)
+                    for review in sorted(self.reviews[:-1], key=lambda review: (-review.rating, -review.id))]
+        self.assertEqual(self.walk('-rating'), expected)
+
+    def test_cursor_walks_date_feed(self):
+        self.assertEqual(self.walk('date'), [(review.gamer.username, review.rating) for review in self.reviews[:-1]])
+
+    def test_game_payload_keeps_reviews_key_with_latest_reviews(self):
+        refresh_game_cards([self.game.id])
+        listed = {game['id']: game for game in self.gamer_client.get(reverse('games-list')).json()['games']}
+        self.assertEqual([review['gamer'] for review in listed[self.game.id]['reviews']],
+                         ['reviewer4', 'reviewer3', 'reviewer2'])
+
+
+class RebuildRatingsTests(ApiTestCase):
+    def test_rebuild_refreshes_cards_and_cached_lists(self):
+        game = self.games[0]
+        local_cache.clear()
+        self.gamer_client.get(reverse('games-list'))
+        # Отзыв записан в обход представлений, агрегаты игры устарели
+        Review.objects.create(game=game, gamer=self.gamer, rating=80, comment='ok')
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_game_ratings', stdout=StringIO())
+        listed = {item['id']: item for item in self.gamer_client.get(reverse('games-list')).json()['games']}
+        self.assertEqual((listed[game.id]['review_count'], listed[game.id]['rating_avg']), (1, 80))
+        self.assertEqual(listed[self.games[1].id]['review_count'], 0)
+
+
+# ================================== ИМПОРТ КАТАЛОГА ==================================
+class ImportGamesTests(ApiTestCase):
+    def upload(self, content, name='games.ndjson'):
+        return self.admin_client.post(reverse('import-games'), {'file': SimpleUploadedFile(name, content)},
+                                      format='multipart')
+
+    def test_malformed_rows_are_reported_not_fatal(self):
+        content = b'\n'.join([
+            b'{"title": 5, "price": 1}',
+            b'{"title": "Bad description", "price": 1, "description": 5}',
+            b'{"title": "Not a number", "price": NaN}',
+            b'{"title": "Infinite", "price": "inf"}',
+            b'{"title": "\xff\xfe broken", "price": 1}',
+            b'{"title": "Fine", "price": 3}',
+        ])
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 201)
+        report = response.json()
+        self.assertEqual((report['created'], report['errors']), (1, 5))
+        self.assertEqual([error['line'] for error in report['error_details']], [1, 2, 3, 4, 5])
+
+    def test_undecodable_csv_row_is_reported(self):
+        response = self.upload(b'title,price\n\xff broken,1\nFine,2\n', name='games.csv')
+        self.assertEqual((response.json()['created'], response.json()['errors']), (1, 1))
+
+    def test_title_taken_concurrently_is_counted_as_duplicate(self):
+        # Параллельный запрос создал игру уже после того, как импорт проверил дубликаты
+        Game.objects.create(title='Raced', price=1, description='d')
+        real_existing_titles = catalog_io._existing_titles
+        with mock.patch.object(catalog_io, '_existing_titles',
+                               side_effect=[set(), real_existing_titles(['Raced', 'Other'])]):
+            response = self.upload(b'{"title": "Raced", "price": 1}\n{"title": "Other", "price": 2}')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['created'], response.json()['duplicates']), (1, 1))
+        self.assertEqual(Game.objects.filter(title='Raced').count(), 1)
@@ -0,0 +1,112 @@
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from egames.models import Gamer, WalletEntry, WalletSnapshot
+
+# Снимок баланса делается, когда после предыдущего снимка накопилось столько записей
+SNAPSHOT_MIN_TAIL = 50
+SNAPSHOT_BATCH_SIZE = 500
+# id записей выдаются при вставке, а видимыми становятся при коммите, поэтому запись с меньшим id
+# может появиться позже записи с большим. Снимок захватывает только записи старше этого запаса,
+# который должен быть заметно больше самой длинной транзакции с кошельком
+SNAPSHOT_SAFETY_MARGIN = timedelta(minutes=5)
+
+
+def to_cents(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return cents / 100
+
+
+def record_entries(entries):
+    """Дописывает записи в журнал кошелька; существующие записи никогда не изменяются."""
+    WalletEntry.objects.bulk_create(entries)
+
+
+def deposit(gamer_id, amount):
+    """
+    Пополнение: запись в журнал и атомарное увеличение кэшированного баланса Gamer.wallet
+    без чтения-изменения-записи. Возвращает новый баланс.
+    Gamer.wallet сохраняется намеренно: условное списание при покупке (wallet >= цена) проверяет одну строку,
+    а журнал служит историей и сверкой (find_mismatches).
+    """
+    with transaction.atomic():
+        record_entries([WalletEntry(gamer_id=gamer_id, amount_cents=to_cents(amount), kind=WalletEntry.DEPOSIT)])
+        Gamer.objects.filter(pk=gamer_id).update(wallet=F('wallet') + amount)
+    return Gamer.objects.filter(pk=gamer_id).values_list('wallet', flat=True).get()
+
+
+def _latest_snapshot(gamer_id):
+    return (WalletSnapshot.objects.filter(gamer_id=gamer_id).order_by('-last_entry_id')
+            .values_list('last_entry_id', 'balance_cents').first()) or (0, 0)
+
+
+def ledger_balance_cents(gamer_id):
+    """Баланс по журналу: последний снимок плюс короткий хвост записей после него."""
+    last_entry_id, balance = _latest_snapshot(gamer_id)
+    tail = (WalletEntry.objects.filter(gamer_id=gamer_id, id__gt=last_entry_id)
+            .aggregate(total=Sum('amount_cents'))['total'])
+    return balance + (tail or 0)
+
+
+def _tails(before=None):
+    """
+    Хвосты журнала после последнего снимка по каждому геймеру.
+    С before хвост обрезается по последней записи геймера, созданной раньше before.
+    """
+    last_snapshot = (WalletSnapshot.objects.filter(gamer=OuterRef('gamer')).order_by('-last_entry_id')
+                     .values('last_entry_id')[:1])
+    entries = (WalletEntry.objects.annotate(since=Coalesce(Subquery(last_snapshot), 0))
+               .filter(id__gt=F('since')))
+    if before is not None:
+        boundary = (WalletEntry.objects.filter(gamer=OuterRef('gamer'), created_at__lt=before)
+                    .values('gamer').annotate(last_id=Max('id')).values('last_id'))
+        entries = entries.annotate(boundary=Subquery(boundary)).filter(id__lte=F('boundary'))
+    return entries.values('gamer').annotate(count=Count('id'), total=Sum('amount_cents'), last_id=Max('id'))
+
+
+def _snapshot_balances(gamer_ids):
+    latest = (WalletSnapshot.objects.filter(gamer=OuterRef('gamer')).order_by('-last_entry_id').values('id')[:1])
+    return dict(WalletSnapshot.objects.filter(gamer_id__in=gamer_ids, id=Subquery(latest))
+                .values_list('gamer_id', 'balance_cents'))
+
+
+def take_snapshots(min_tail=SNAPSHOT_MIN_TAIL):
+    """
+    Делает снимки баланса для геймеров, у которых после прошлого снимка накопился длинный хвост записей.
+    Свежие записи (моложе SNAPSHOT_SAFETY_MARGIN) в снимок не попадают и остаются в хвосте.
+    """
+    tails = list(_tails(before=timezone.now() - SNAPSHOT_SAFETY_MARGIN).filter(count__gte=min_tail))
+    created = 0
+    for start in range(0, len(tails), SNAPSHOT_BATCH_SIZE):
+        chunk = tails[start:start + SNAPSHOT_BATCH_SIZE]
+        balances = _snapshot_balances([row['gamer'] for row in chunk])
+        WalletSnapshot.objects.bulk_create([
+            WalletSnapshot(gamer_id=row['gamer'], last_entry_id=row['last_id'],
+                           balance_cents=balances.get(row['gamer'], 0) + row['total'])
+            for row in chunk
+        ])
+        created += len(chunk)
+    return created
+
+
+def find_mismatches():
+    """Сверка: геймеры, у которых кэшированный Gamer.wallet расходится с балансом по журналу."""
+    tails = {row['gamer']: row['total'] for row in _tails()}
+    gamer_ids = list(Gamer.objects.order_by('id').values_list('id', flat=True))
+    mismatches = []
+    for start in range(0, len(gamer_ids), SNAPSHOT_BATCH_SIZE):
+        chunk = gamer_ids[start:start + SNAPSHOT_BATCH_SIZE]
+        balances = _snapshot_balances(chunk)
+        for gamer_id, wallet in Gamer.objects.filter(id__in=chunk).values_list('id', 'wallet'):
+            ledger = balances.get(gamer_id, 0) + tails.get(gamer_id, 0)
+            if to_cents(wallet) != ledger:
+                mismatches.append((gamer_id, to_cents(wallet), ledger))
+    return mismatches